@@ -0,0 +1,130 @@
+"""Представление объектов в JSON.
+
+Каждое поле ответа знает столбцы модели, из которых оно строится.
+Сериализатор выбирает из базы только столбцы запрошенных полей
+(?fields=) и присоединяет связанные таблицы через select_related,
+поэтому страница любого размера читается одним запросом.
+"""
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class Field:
+    def __init__(self, *columns, get=None):
+        self.columns = columns
+        self.get = get or (lambda obj: getattr(obj, columns[0]))
+
+
+def isoformat(name):
+    return lambda obj: getattr(obj, name).isoformat()
+
+
+def username(name):
+    return lambda obj: getattr(obj, name).username
+
+
+def stat(name):
+    def get(user):
+        stats = getattr(user, 'stats', None)
+        return getattr(stats, name, 0)
+    return get
+
+
+class Serializer:
+    model = None
+    fields = {}
+
+    def __init__(self, names=None):
+        """names — запрошенные поля; неизвестные поля — ValueError."""
+        names = list(names or self.fields)
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(unknown)}')
+        self.names = names
+
+    def columns(self):
+        columns = {self.model._meta.pk.name}
+        for name in self.names:
+            columns.update(self.fields[name].columns)
+        return columns
+
+    def prepare(self, queryset, *extra):
+        """Ограничивает выборку столбцами запрошенных полей и extra."""
+        columns = self.columns() | set(extra)
+        related = {
+            column.rsplit('__', 1)[0] for column in columns if '__' in column
+        }
+        # Поле связи нужно и само по себе, иначе only() не даст
+        # пройти по нему в select_related.
+        columns.update(name.split('__')[0] for name in related)
+        return queryset.select_related(*related).only(*columns)
+
+    def to_dict(self, obj):
+        return {name: self.fields[name].get(obj) for name in self.names}
+
+    def many(self, objects):
+        return [self.to_dict(obj) for obj in objects]
+
+
+class PostSerializer(Serializer):
+    model = Post
+    fields = {
+        'id': Field('id'),
+        'text': Field('text'),
+        'pub_date': Field('pub_date', get=isoformat('pub_date')),
+        'author': Field('author__username', get=username('author')),
+        'group': Field(
+            'group__slug',
+            get=lambda post: post.group.slug if post.group_id else None,
+        ),
+        'image': Field(
+            'image', get=lambda post: post.image.url if post.image else None
+        ),
+        'comments_count': Field('comments_count'),
+    }
+
+
+class CommentSerializer(Serializer):
+    model = Comment
+    fields = {
+        'id': Field('id'),
+        'post': Field('post_id'),
+        'author': Field('author__username', get=username('author')),
+        'text': Field('text'),
+        'created': Field('created', get=isoformat('created')),
+    }
+
+
+class GroupSerializer(Serializer):
+    model = Group
+    fields = {
+        'id': Field('id'),
+        'title': Field('title'),
+        'slug': Field('slug'),
+        'description': Field('description'),
+    }
+
+
+class FollowSerializer(Serializer):
+    model = Follow
+    fields = {
+        'user': Field('user__username', get=username('user')),
+        'author': Field('author__username', get=username('author')),
+    }
+
+
+class UserSerializer(Serializer):
+    model = User
+    fields = {
+        'username': Field('username'),
+        'first_name': Field('first_name'),
+        'last_name': Field('last_name'),
+        'posts_count': Field(
+            'stats__posts_count', get=stat('posts_count')
+        ),
+        'followers_count': Field(
+            'stats__followers_count', get=stat('followers_count')
+        ),
+        'following_count': Field(
+            'stats__following_count', get=stat('following_count')
+        ),
+    }
@@ -0,0 +1,217 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+class ApiTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def send(self, method, url, data):
+        return getattr(self.client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_posts_pages_by_cursor(self):
+        """Список постов выводится по курсору без повторов"""
+        url = reverse('api:posts')
+        seen = []
+        response = self.client.get(url, {'limit': 2})
+        while True:
+            data = response.json()
+            seen += [post['id'] for post in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+    def test_fields_selection(self):
+        """Параметр fields ограничивает состав полей"""
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,author,group'}
+        )
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': self.posts[-1].pk, 'author': 'author', 'group': 'group'},
+        )
+        response = self.client.get(reverse('api:posts'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json()['errors'])
+
+    def test_lists_use_constant_queries(self):
+        """Число запросов не зависит от размера страницы"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for name in ('api:posts', 'api:feed', 'api:follows', 'api:groups'):
+            with self.subTest(name=name):
+                counts = []
+                for limit in (1, 50):
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(reverse(name), {'limit': limit})
+                    counts.append(len(queries))
+                self.assertEqual(counts[0], counts[1])
+
+    def test_user_etag_changes_on_follow(self):
+        """Подписка меняет ETag пользователя-подписчика в API"""
+        url = reverse('api:user', args=(self.reader.username,))
+        response = self.client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['following_count'], 1)
+
+    def test_etag_not_modified(self):
+        """Повторный запрос с ETag получает 304 без выборки данных"""
+        url = reverse('api:post', args=(self.posts[0].pk,))
+        response = self.client.get(url)
+        tag = response['ETag']
+        self.assertEqual(response.json()['comments_count'], 1)
+        # Только сессия и пользователь: кэш тестов — в памяти процесса,
+        # поэтому сессия читается из базы.
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Еще'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 2)
+
+    def test_create_and_edit_post(self):
+        """Пост создается и редактируется автором"""
+        response = self.send(
+            'post', reverse('api:posts'), {'text': 'Новый', 'group': 'group'}
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(
+            (data['text'], data['author'], data['group']),
+            ('Новый', 'reader', 'group'),
+        )
+        url = reverse('api:post', args=(data['id'],))
+        response = self.send('patch', url, {'text': 'Исправленный'})
+        self.assertEqual(response.json()['text'], 'Исправленный')
+        self.assertEqual(response.json()['group'], 'group')
+        response = self.send('patch', url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_only_author_changes_post(self):
+        """Чужой пост нельзя изменить или удалить"""
+        url = reverse('api:post', args=(self.posts[0].pk,))
+        self.assertEqual(
+            self.send('patch', url, {'text': 'Чужой'}).status_code, 403
+        )
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_anonymous_cannot_write(self):
+        """Гость читает, но не пишет"""
+        self.client.logout()
+        self.assertEqual(
+            self.client.get(reverse('api:posts')).status_code, 200
+        )
+        response = self.send('post', reverse('api:posts'), {'text': 'Гость'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get(reverse('api:feed')).status_code, 401)
+
+    def test_comments(self):
+        """Комментарии читаются и добавляются"""
+        url = reverse('api:comments', args=(self.posts[1].pk,))
+        response = self.send('post', url, {'text': 'Мой комментарий'})
+        self.assertEqual(response.status_code, 201)
+        results = self.client.get(url).json()['results']
+        self.assertEqual(
+            [(comment['author'], comment['text']) for comment in results],
+            [('reader', 'Мой комментарий')],
+        )
+        missing = reverse('api:comments', args=(0,))
+        self.assertEqual(self.client.get(missing).status_code, 404)
+
+    def test_follow_and_feed(self):
+        """Подписка добавляет посты автора в ленту"""
+        response = self.send(
+            'post', reverse('api:follows'), {'author': 'author'}
+        )
+        self.assertEqual(response.status_code, 201)
+        feed = self.client.get(reverse('api:feed')).json()['results']
+        self.assertEqual(len(feed), 5)
+        self.assertEqual(
+            self.send(
+                'post', reverse('api:follows'), {'author': 'reader'}
+            ).status_code,
+            400,
+        )
+        user = self.client.get(reverse('api:user', args=('author',))).json()
+        self.assertEqual(
+            (user['posts_count'], user['followers_count']), (5, 1)
+        )
+        url = reverse('api:follow', args=('author',))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('api:feed')).json()['results'], []
+        )
+
+    def test_bulk_follow(self):
+        """Подписка и отписка списками возвращают изменившихся авторов"""
+        other = User.objects.create_user(username='other')
+        url = reverse('api:follows_bulk')
+        response = self.send(
+            'post', url, {'follow': ['author', 'other', 'reader', 'nobody']}
+        )
+        self.assertEqual(
+            response.json(),
+            {'followed': ['author', 'other'], 'unfollowed': []},
+        )
+        self.assertEqual(
+            len(self.client.get(reverse('api:feed')).json()['results']), 5
+        )
+        response = self.send(
+            'post', url, {'follow': ['author'], 'unfollow': ['author']}
+        )
+        self.assertEqual(
+            response.json(), {'followed': [], 'unfollowed': ['author']}
+        )
+        self.assertEqual(
+            list(Follow.objects.values_list('author', flat=True)), [other.pk]
+        )
+        response = self.send('post', url, {'follow': 'author'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('follow', response.json()['errors'])
+
+    def test_method_not_allowed(self):
+        """Неподдерживаемый метод получает 405 со списком разрешенных"""
+        response = self.client.delete(reverse('api:posts'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD, POST')
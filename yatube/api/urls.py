@@ -0,0 +1,22 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post, name='post'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+    path('groups/', views.groups, name='groups'),
+    path('groups/<slug:slug>/', views.group, name='group'),
+    path('users/<str:username>/', views.user, name='user'),
+    path('feed/', views.feed, name='feed'),
+    path('follows/', views.follows, name='follows'),
+    path('follows/bulk/', views.follows_bulk, name='follows_bulk'),
+    path('follows/<str:username>/', views.follow, name='follow'),
+]
@@ -0,0 +1,352 @@
+"""JSON API постов, групп, комментариев и подписок.
+
+Списки выводятся по курсору (?cursor=, ?limit=), состав полей задается
+параметром ?fields=. Ответы на GET помечаются ETag по версиям
+пространств имен кэша (posts.cache): проверка If-None-Match не трогает
+базу, а ответ 304 отдается до выборки данных. Авторизация — сессией
+сайта; изменяющие запросы проходят обычную проверку CSRF.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from posts import follow_graph
+from posts.cache import etag
+from posts.feed import feed_posts
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import CursorPaginator
+
+from .serializers import (CommentSerializer, FollowSerializer,
+                          GroupSerializer, PostSerializer, UserSerializer)
+
+POST_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('-created', '-pk')
+BULK_LIMIT = 100
+
+
+class BadRequest(Exception):
+    def __init__(self, **errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def error(status, **errors):
+    return json_response({'errors': errors}, status)
+
+
+def api_view(*methods, login=()):
+    """Проверяет метод и авторизацию и переводит ошибки в JSON.
+
+    login — методы, доступные только авторизованным пользователям.
+    """
+    allowed = set(methods) | ({'HEAD'} if 'GET' in methods else set())
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = error(405, method=['Метод не поддерживается'])
+                response['Allow'] = ', '.join(sorted(allowed))
+                return response
+            if request.method in login and not request.user.is_authenticated:
+                return error(401, user=['Нужна авторизация'])
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return error(404, detail=['Не найдено'])
+            except BadRequest as exc:
+                return error(400, **exc.errors)
+        return wrapper
+    return decorator
+
+
+def conditional(request, namespaces, build):
+    """Ответ 304, если ETag клиента совпал, иначе ответ build()."""
+    tag = etag(request, *namespaces)
+    if tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponse(status=304)
+    else:
+        response = build()
+    response['ETag'] = tag
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def serializer(request, serializer_class):
+    names = [
+        name.strip()
+        for name in request.GET.get('fields', '').split(',') if name.strip()
+    ]
+    try:
+        return serializer_class(names)
+    except ValueError as exc:
+        raise BadRequest(fields=[str(exc)])
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise BadRequest(limit=['Ожидается целое число'])
+    return min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def paginated(request, queryset, serializer_class, ordering):
+    fields = serializer(request, serializer_class)
+    # Поля через связи CursorPaginator читает из аннотаций.
+    columns = [
+        name.lstrip('-') for name in ordering
+        if name != '-pk' and '__' not in name
+    ]
+    paginator = CursorPaginator(
+        fields.prepare(queryset, *columns), page_size(request), ordering
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    return json_response({
+        'results': fields.many(page),
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+def detail(request, queryset, serializer_class, **lookup):
+    fields = serializer(request, serializer_class)
+    obj = get_object_or_404(fields.prepare(queryset), **lookup)
+    return json_response(fields.to_dict(obj))
+
+
+def request_data(request):
+    """Данные запроса: JSON или, для POST, поля формы с файлами."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            raise BadRequest(body=['Некорректный JSON'])
+        if not isinstance(data, dict):
+            raise BadRequest(body=['Ожидается объект JSON'])
+        return data, None
+    if request.method == 'POST':
+        return request.POST.dict(), request.FILES
+    raise BadRequest(body=['Ожидается JSON'])
+
+
+def post_form(request, post=None):
+    data, files = request_data(request)
+    if post is not None:
+        data = {'text': post.text, 'group': post.group_id, **data}
+    if isinstance(data.get('group'), str):
+        # Группа указывается по slug, как в ответах API.
+        group_id = Group.objects.filter(slug=data['group']).values_list(
+            'pk', flat=True
+        ).first()
+        data['group'] = group_id or data['group']
+    return PostForm(data, files=files, instance=post)
+
+
+def saved(form, **attributes):
+    if not form.is_valid():
+        raise BadRequest(**form.errors)
+    obj = form.save(commit=False)
+    for name, value in attributes.items():
+        setattr(obj, name, value)
+    obj.save()
+    return obj
+
+
+@api_view('GET', 'POST', login=('POST',))
+def posts(request):
+    if request.method == 'POST':
+        post = saved(post_form(request), author=request.user)
+        return json_response(PostSerializer().to_dict(post), 201)
+    queryset = Post.objects.all()
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return conditional(
+        request,
+        ('index',),
+        lambda: paginated(request, queryset, PostSerializer, POST_ORDERING),
+    )
+
+
+@api_view('GET', 'PATCH', 'DELETE', login=('PATCH', 'DELETE'))
+def post(request, post_id):
+    if request.method == 'GET':
+        return conditional(
+            request,
+            (f'post:{post_id}',),
+            lambda: detail(
+                request, Post.objects.all(), PostSerializer, pk=post_id
+            ),
+        )
+    instance = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
+    if instance.author_id != request.user.pk:
+        return error(403, user=['Изменять пост может только автор'])
+    if request.method == 'DELETE':
+        instance.delete()
+        return HttpResponse(status=204)
+    instance = saved(post_form(request, instance))
+    return json_response(PostSerializer().to_dict(instance))
+
+
+@api_view('GET', 'POST', login=('POST',))
+def comments(request, post_id):
+    if request.method == 'POST':
+        instance = get_object_or_404(Post, pk=post_id)
+        data, _ = request_data(request)
+        comment = saved(CommentForm(data), author=request.user, post=instance)
+        return json_response(CommentSerializer().to_dict(comment), 201)
+
+    def build():
+        get_object_or_404(Post.objects.only('pk'), pk=post_id)
+        return paginated(
+            request,
+            Comment.objects.filter(post_id=post_id),
+            CommentSerializer,
+            COMMENT_ORDERING,
+        )
+    return conditional(request, (f'post:{post_id}',), build)
+
+
+@api_view('GET')
+def groups(request):
+    return conditional(
+        request,
+        ('index',),
+        lambda: paginated(
+            request, Group.objects.all(), GroupSerializer, ('pk',)
+        ),
+    )
+
+
+@api_view('GET')
+def group(request, slug):
+    return conditional(
+        request,
+        ('index',),
+        lambda: detail(request, Group.objects.all(), GroupSerializer,
+                       slug=slug),
+    )
+
+
+@api_view('GET')
+def user(request, username):
+    author_id = get_object_or_404(
+        User.objects.only('pk'), username=username
+    ).pk
+    return conditional(
+        request,
+        (f'profile:{author_id}',),
+        lambda: detail(request, User.objects.all(), UserSerializer,
+                       pk=author_id),
+    )
+
+
+@api_view('GET', login=('GET',))
+def feed(request):
+    def page():
+        posts, ordering = feed_posts(request.user)
+        return paginated(request, posts, PostSerializer, ordering)
+
+    return conditional(
+        request, ('index', f'follow:{request.user.pk}'), page
+    )
+
+
+@api_view('GET', 'POST', login=('GET', 'POST'))
+def follows(request):
+    if request.method == 'GET':
+        return conditional(
+            request,
+            (f'follow:{request.user.pk}',),
+            lambda: paginated(
+                request,
+                Follow.objects.filter(user=request.user),
+                FollowSerializer,
+                ('-pk',),
+            ),
+        )
+    data, _ = request_data(request)
+    author = User.objects.filter(username=data.get('author')).first()
+    if author is None:
+        raise BadRequest(author=['Пользователь не найден'])
+    if author == request.user:
+        raise BadRequest(author=['Нельзя подписаться на себя'])
+    follow, created = Follow.objects.get_or_create(
+        user=request.user, author=author
+    )
+    return json_response(
+        FollowSerializer().to_dict(follow), 201 if created else 200
+    )
+
+
+def usernames(data, name):
+    value = data.get(name, [])
+    if not isinstance(value, list) or not all(
+        isinstance(item, str) for item in value
+    ):
+        raise BadRequest(**{name: ['Ожидается список имен пользователей']})
+    if len(value) > BULK_LIMIT:
+        raise BadRequest(**{name: [f'Не больше {BULK_LIMIT} имен']})
+    return list(dict.fromkeys(value))
+
+
+@api_view('POST', login=('POST',))
+def follows_bulk(request):
+    """Подписка на авторов и отписка от них списками.
+
+    Тело: {"follow": [имена], "unfollow": [имена]}; в ответе — имена
+    авторов, подписка на которых действительно появилась или снята.
+    """
+    data, _ = request_data(request)
+    names = {name: usernames(data, name) for name in ('follow', 'unfollow')}
+    ids = dict(
+        User.objects.filter(
+            username__in=names['follow'] + names['unfollow']
+        ).values_list('username', 'pk')
+    )
+    result = {}
+    for name, change in (
+        ('follow', follow_graph.follow_many),
+        ('unfollow', follow_graph.unfollow_many),
+    ):
+        changed = change(
+            request.user, [ids[u] for u in names[name] if u in ids]
+        )
+        result[f'{name}ed'] = [u for u in names[name] if ids.get(u) in changed]
+    return json_response(result)
+
+
+@api_view('DELETE', login=('DELETE',))
+def follow(request, username):
+    deleted = Follow.objects.filter(
+        user=request.user, author__username=username
+    ).delete()
+    if not deleted[0]:
+        raise Http404
+    return HttpResponse(status=204)
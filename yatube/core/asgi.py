@@ -0,0 +1,180 @@
+"""ASGI-приложение поверх WSGI-обработчика Django.
+
+В Django 2.2 нет ни ASGI-обработчика, ни асинхронных view, поэтому
+запрос обслуживается так: цикл событий принимает тело запроса
+и отдает ответ клиенту, а сам view выполняется в пуле из
+settings.ASGI_THREADS потоков. Медленный клиент занимает только
+сокет, а поток пула освобождается сразу после работы view. Если клиент
+отключился, не дослав тело, view не вызывается. Потоковые ответы
+отдаются по частям и держат поток пула до конца отдачи.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+
+class WsgiToAsgi:
+    def __init__(self, wsgi_application, threads=None):
+        self.wsgi_application = wsgi_application
+        self.threads = threads
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Пул создается при первом запросе: к этому моменту настройки
+        # уже загружены.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.threads or settings.ASGI_THREADS,
+                thread_name_prefix='asgi',
+            )
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемое соединение: {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            # Клиент ушел, не дослав тело: view не должен видеть обрывок.
+            return
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        try:
+            messages = await loop.run_in_executor(
+                self.executor, self.run, environ(scope, body),
+                send_from_thread,
+            )
+        finally:
+            body.close()
+        for message in messages:
+            await send(message)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                    self._executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса; большое тело уходит из памяти во временный файл.
+
+        Если клиент отключился раньше конца тела, возвращает None.
+        """
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        return body
+
+    def run(self, environ, send):
+        """Выполняет WSGI-приложение в потоке пула.
+
+        Готовое содержимое ответа Django уже лежит в памяти, поэтому
+        сообщения с ним возвращаются, и отдает их цикл событий, когда
+        поток пула уже свободен. Потоковый ответ (StreamingHttpResponse,
+        FileResponse) целиком в память не читается: каждая часть
+        отправляется через send, как только получена, и поток пула
+        занят до конца отдачи.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers
+            ]
+
+        def start():
+            return {
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': started['headers'],
+            }
+
+        response = self.wsgi_application(environ, start_response)
+        try:
+            if not getattr(response, 'streaming', True):
+                return [start()] + [
+                    body_message(chunk) for chunk in response if chunk
+                ] + [body_message(b'', more_body=False)]
+            # start_response генератора вызывается при первой итерации.
+            is_started = False
+            for chunk in response:
+                if not is_started:
+                    send(start())
+                    is_started = True
+                if chunk:
+                    send(body_message(chunk))
+            if not is_started:
+                send(start())
+            send(body_message(b'', more_body=False))
+            return []
+        finally:
+            if hasattr(response, 'close'):
+                response.close()
+
+
+def body_message(chunk, more_body=True):
+    message = {'type': 'http.response.body', 'body': chunk}
+    if more_body:
+        message['more_body'] = True
+    return message
+
+
+def environ(scope, body):
+    """Окружение WSGI (PEP 3333) для HTTP-запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    # Строки окружения WSGI — байты, прочитанные как latin-1.
+    path = scope['path'].encode('utf-8').decode('latin1')
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in result:
+            value = f'{result[name]},{value}'
+        result[name] = value
+    return result
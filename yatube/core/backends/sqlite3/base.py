@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+from core import sqlite
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, транзакции которого сразу берут блокировку записи.
+
+    При SQLITE_TUNING транзакция в базе-файле открывается под
+    sqlite.write_lock командой BEGIN IMMEDIATE; блокировка отпускается
+    при COMMIT, ROLLBACK или закрытии соединения. Базу в памяти (тесты)
+    соединения делят через общий кэш SQLite, где блокировки табличные
+    и busy_timeout не действует, поэтому там транзакции обычные.
+    """
+
+    write_lock = None
+
+    def _start_transaction_under_autocommit(self):
+        if not settings.SQLITE_TUNING or self.is_in_memory_db():
+            return super()._start_transaction_under_autocommit()
+        lock = sqlite.write_lock(self.settings_dict['NAME'])
+        sqlite.acquire(lock)
+        self.write_lock = lock
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def release_write_lock(self):
+        lock, self.write_lock = self.write_lock, None
+        if lock is not None:
+            lock.release()
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
@@ -0,0 +1,57 @@
+"""Настройка общего кэша по адресу из переменной окружения CACHE_URL.
+
+Поддерживаемые адреса:
+    redis://host:6379/0      общий кэш для всех воркеров (нужен django-redis);
+    file:///var/tmp/yatube   файловый кэш, общий для воркеров одного сервера;
+    db://yatube_cache        таблица в базе (manage.py createcachetable);
+    locmem://                кэш в памяти процесса, для разработки и тестов.
+
+instrumented() оборачивает настройку кэша прокси, который считает
+попадания и промахи для замеров core.metrics. is_shared() проверяет,
+видят ли кэш все воркеры.
+"""
+from urllib.parse import urlsplit
+
+CACHE_BACKENDS = {
+    'redis': 'django_redis.cache.RedisCache',
+    'rediss': 'django_redis.cache.RedisCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+LOCAL_BACKENDS = (
+    CACHE_BACKENDS['locmem'],
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_config(url, **options):
+    parts = urlsplit(url)
+    if parts.scheme not in CACHE_BACKENDS:
+        raise ValueError(f'Неизвестный бэкенд кэша: {url}')
+    if parts.scheme.startswith('redis'):
+        location = url
+    elif parts.scheme == 'file':
+        location = parts.netloc + parts.path
+    else:
+        location = parts.netloc
+    config = {
+        'BACKEND': CACHE_BACKENDS[parts.scheme],
+        'LOCATION': location,
+    }
+    config.update(options)
+    return config
+
+
+def instrumented(config):
+    return {
+        'BACKEND': 'core.metrics.InstrumentedCache',
+        'OPTIONS': {'backend': config},
+    }
+
+
+def is_shared(config):
+    """Общий ли кэш для воркеров: кэш в памяти процесса — нет."""
+    if config['BACKEND'] == 'core.metrics.InstrumentedCache':
+        config = config['OPTIONS']['backend']
+    return config['BACKEND'] not in LOCAL_BACKENDS
@@ -0,0 +1,165 @@
+"""Постоянные соединения с базой: проверка, пул и замеры по воркерам.
+
+Соединение живет CONN_MAX_AGE секунд и переживает запросы. Перед
+запросом открытые соединения проверяются (DATABASE_HEALTH_CHECKS):
+оборванное соединение закрывается, и Django откроет новое, вместо того
+чтобы уронить запрос ошибкой.
+
+ConnectionPoolMiddleware ограничивает число запросов воркера, которые
+одновременно работают с базой, значением DATABASE_POOL_SIZE: остальные
+ждут свободного места не дольше DATABASE_POOL_TIMEOUT секунд и получают
+ответ 503. Счетчики соединений и ожиданий каждый воркер раз
+в METRICS_FLUSH_INTERVAL секунд кладет в общий кэш; их показывает
+команда show_metrics.
+
+Общего списка воркеров нет: воркер занимает в кэше свободную ячейку
+(cache.add атомарен) из METRICS_WORKER_SLOTS и хранит в ней счетчики
+с ограниченным временем жизни. Ячейка умершего воркера истекает
+и освобождается сама.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+
+SLOT_KEY = 'metrics:pool:slot:{}'
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class WorkerStats:
+    """Счетчики соединений одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.in_use = 0
+        self.flushed = 0.0
+        self.slot = None
+
+    def add(self, **values):
+        with self.lock:
+            self.counts.update(values)
+
+    def checkout(self, waited):
+        with self.lock:
+            self.in_use += 1
+            self.counts['checkouts'] += 1
+            self.counts['wait_us'] += round(waited * 10 ** 6)
+            self.counts['peak'] = max(self.counts['peak'], self.in_use)
+
+    def checkin(self):
+        with self.lock:
+            self.in_use -= 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts, in_use=self.in_use, pid=os.getpid())
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        cache = caches[settings.METRICS_CACHE]
+        snapshot = self.snapshot()
+        # Данные воркера, который перестал их обновлять, устаревают.
+        timeout = max(settings.METRICS_FLUSH_INTERVAL * 10, 60)
+        if self.slot is not None:
+            current = cache.get(SLOT_KEY.format(self.slot))
+            if current and current['pid'] == snapshot['pid']:
+                cache.set(SLOT_KEY.format(self.slot), snapshot, timeout)
+                return
+        # Ячейки еще нет, она истекла или досталась от родителя при fork.
+        self.slot = None
+        for slot in range(settings.METRICS_WORKER_SLOTS):
+            if cache.add(SLOT_KEY.format(slot), snapshot, timeout):
+                self.slot = slot
+                return
+
+
+stats = WorkerStats()
+
+
+def slot_keys():
+    return [
+        SLOT_KEY.format(slot) for slot in range(settings.METRICS_WORKER_SLOTS)
+    ]
+
+
+def read():
+    """Счетчики всех воркеров, которые недавно их выгружали."""
+    found = caches[settings.METRICS_CACHE].get_many(slot_keys())
+    return sorted(found.values(), key=lambda snapshot: snapshot['pid'])
+
+
+def reset():
+    caches[settings.METRICS_CACHE].delete_many(slot_keys())
+
+
+def check_connections():
+    """Проверяет соединения, оставшиеся открытыми после прошлых запросов.
+
+    Подключается после close_old_connections Django, поэтому видит
+    только соединения, которые тот решил оставить.
+    """
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        if settings.DATABASE_HEALTH_CHECKS and not connection.is_usable():
+            connection.close()
+            stats.add(dropped=1)
+        else:
+            stats.add(reused=1)
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.semaphore = threading.BoundedSemaphore(size) if size else None
+
+    def acquire(self):
+        """Занимает место в пуле и возвращает время ожидания в секундах."""
+        started = time.perf_counter()
+        if self.semaphore is not None and not self.semaphore.acquire(
+            timeout=self.timeout
+        ):
+            stats.add(timeouts=1)
+            raise PoolTimeout
+        waited = time.perf_counter() - started
+        stats.checkout(waited)
+        return waited
+
+    def release(self):
+        stats.checkin()
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+class ConnectionPoolMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pool = ConnectionPool(
+            settings.DATABASE_POOL_SIZE, settings.DATABASE_POOL_TIMEOUT
+        )
+
+    def __call__(self, request):
+        try:
+            self.pool.acquire()
+        except PoolTimeout:
+            response = HttpResponse('Сервер перегружен', status=503)
+            response['Retry-After'] = '1'
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            self.pool.release()
+            stats.flush()
@@ -0,0 +1,94 @@
+"""Чтение с реплик базы и закрепление за основной базой после записи.
+
+ReplicaRouter отправляет чтение моделей приложений settings.REPLICA_APPS
+на одну из реплик settings.DATABASE_REPLICAS, а запись — в default.
+Реплика выбирается одна на запрос: реплики отстают по-разному, и число
+строк страницы не должно браться с одной, а сами строки — с другой.
+Реплика отстает от основной базы, поэтому пользователь, который только
+что что-то записал, на REPLICA_STICKY_SECONDS секунд закрепляется
+за основной базой: ReplicaMiddleware ставит ему cookie REPLICA_COOKIE.
+Внутри транзакции чтение тоже идет в основную базу.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def pin():
+    """Направляет дальнейшее чтение в этом потоке в основную базу."""
+    _state.pinned = True
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+def replica():
+    """Реплика текущего запроса; выбирается при первом чтении."""
+    name = getattr(_state, 'replica', None)
+    if name not in settings.DATABASE_REPLICAS:
+        name = _state.replica = random.choice(settings.DATABASE_REPLICAS)
+    return name
+
+
+class ReplicaRouter:
+    def routed(self, model):
+        return (
+            settings.DATABASE_REPLICAS
+            and model._meta.app_label in settings.REPLICA_APPS
+        )
+
+    def db_for_read(self, model, **hints):
+        if not self.routed(model):
+            return None
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica()
+
+    def db_for_write(self, model, **hints):
+        if not self.routed(model):
+            return None
+        pin()
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приходит с основной базы вместе с данными.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.pinned = settings.REPLICA_COOKIE in request.COOKIES
+        _state.wrote = False
+        _state.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = False
+            _state.replica = None
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_COOKIE,
+                '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.sessions import delete_expired
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие сессии из базы пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько сессий удалять одним запросом',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между пачками в секундах',
+        )
+
+    def handle(self, *args, batch_size, pause, **options):
+        deleted = delete_expired(batch_size, pause)
+        self.stdout.write(f'Удалено истекших сессий: {deleted}')
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+
+from core import connections, metrics
+
+
+class Command(BaseCommand):
+    help = 'Показывает накопленные замеры запросов по именам адресов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить накопленные замеры',
+        )
+
+    def handle(self, *args, reset, **options):
+        if reset:
+            metrics.reset()
+            connections.reset()
+            self.stdout.write('Замеры сброшены')
+            return
+        names = metrics.names()
+        workers = connections.read()
+        if not names and not workers:
+            self.stdout.write('Замеров пока нет')
+            return
+        for name in names:
+            data = metrics.read(name)
+            requests = data['requests'] or 1
+            total = data['total']['buckets']
+            self.stdout.write(
+                f'{name}: запросов {data["requests"]}, '
+                f'p50 ≤ {metrics.percentile(total, 50)} мс, '
+                f'p95 ≤ {metrics.percentile(total, 95)} мс, '
+                f'p99 ≤ {metrics.percentile(total, 99)} мс'
+            )
+            hits, misses = data['cache_hits'], data['cache_misses']
+            self.stdout.write(
+                '  в среднем: SQL {:.1f} мс ({:.1f} запросов), шаблоны '
+                '{:.1f} мс, превью {:.1f} мс; кэш {} hit / {} miss'.format(
+                    data['db']['sum_ms'] / requests,
+                    data['queries'] / requests,
+                    data['template']['sum_ms'] / requests,
+                    data['thumbnail']['sum_ms'] / requests,
+                    hits,
+                    misses,
+                )
+            )
+            self.stdout.write(
+                '  сессии на запрос: из базы {:.2f}, без базы {:.2f}'.format(
+                    data['session_db'] / requests,
+                    data['session_saved'] / requests,
+                )
+            )
+        for worker in workers:
+            checkouts = worker.get('checkouts') or 1
+            self.stdout.write(
+                'Воркер {pid}: соединений открыто {opened}, '
+                'переиспользовано {reused}, оборвано {dropped}; '
+                'пул занят {in_use} (пик {peak}), среднее ожидание '
+                '{wait:.2f} мс, отказов {timeouts}'.format(
+                    wait=worker.get('wait_us', 0) / 1000 / checkouts,
+                    **{
+                        name: worker.get(name, 0)
+                        for name in (
+                            'pid', 'opened', 'reused', 'dropped', 'in_use',
+                            'peak', 'timeouts',
+                        )
+                    },
+                )
+            )
@@ -0,0 +1,335 @@
+"""Замеры запросов: SQL, шаблоны, кэш и превью картинок.
+
+MetricsMiddleware заводит для запроса Recorder. Замеры в него пишут:
+    - обертка выполнения SQL (QueryTimer) на всех соединениях с базой;
+    - шаблонный бэкенд InstrumentedTemplates — время отрисовки страницы
+      (вместе с запросами, которые выполняются из шаблона);
+    - прокси кэша InstrumentedCache — попадания и промахи;
+    - хранилище сессий core.sessions — обращения к django_session
+      и обращения, обошедшиеся без базы;
+    - бэкенд превью posts.thumbnails — время поиска и подготовки превью.
+Итоги уходят в лог core.metrics строкой JSON и в заголовок Server-Timing
+(только при METRICS_SERVER_TIMING или для персонала: в нем видно
+устройство базы, кэша и сессий), а гистограммы длительности по имени
+адреса копятся в памяти процесса и раз в METRICS_FLUSH_INTERVAL секунд
+складываются в общий кэш, откуда их читает команда show_metrics.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TIMINGS = ('total', 'db', 'template', 'thumbnail')
+COUNTERS = (
+    'requests', 'queries', 'cache_hits', 'cache_misses',
+    'session_db', 'session_saved',
+)
+KEY = 'metrics:{}'
+
+_local = threading.local()
+
+
+class Recorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ms = dict.fromkeys(TIMINGS, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.counts['requests'] = 1
+
+    def add_time(self, name, started):
+        self.ms[name] += (time.perf_counter() - started) * 1000
+
+    def finish(self):
+        self.ms['total'] = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        # Значения заголовков — только ASCII.
+        counts = self.counts
+        return ', '.join((
+            f'db;dur={self.ms["db"]:.1f};desc="SQL x{counts["queries"]}"',
+            f'tpl;dur={self.ms["template"]:.1f};desc="Templates"',
+            f'thumb;dur={self.ms["thumbnail"]:.1f};desc="Thumbnails"',
+            'cache;desc="Cache {} hit, {} miss"'.format(
+                counts['cache_hits'], counts['cache_misses']
+            ),
+            'session;desc="Session {} db, {} saved"'.format(
+                counts['session_db'], counts['session_saved']
+            ),
+            f'total;dur={self.ms["total"]:.1f}',
+        ))
+
+    def as_dict(self):
+        data = {f'{name}_ms': round(ms, 2) for name, ms in self.ms.items()}
+        data.update(self.counts)
+        del data['requests']
+        return data
+
+
+def current():
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def timed(name):
+    """Добавляет время блока к замеру name текущего запроса."""
+    recorder = current()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if recorder is not None:
+            recorder.add_time(name, started)
+
+
+def count(name, value=1):
+    recorder = current()
+    if recorder is not None:
+        recorder.counts[name] += value
+
+
+class QueryTimer:
+    def __call__(self, execute, sql, params, many, context):
+        count('queries')
+        with timed('db'):
+            return execute(sql, params, many, context)
+
+
+class Template(DjangoTemplate):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
+
+
+class InstrumentedCache(BaseCache):
+    """Кэш из OPTIONS['backend'], который считает попадания и промахи."""
+
+    def __init__(self, location, params):
+        config = dict(params['OPTIONS']['backend'])
+        backend = import_string(config.pop('BACKEND'))
+        self.cache = backend(config.pop('LOCATION', ''), config)
+        super().__init__({})
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = self.cache.get(key, missing, version)
+        if value is missing:
+            count('cache_misses')
+            return default
+        count('cache_hits')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.cache.get_many(keys, version)
+        count('cache_hits', len(found))
+        count('cache_misses', len(keys) - len(found))
+        return found
+
+    def add(self, *args, **kwargs):
+        return self.cache.add(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self.cache.set(*args, **kwargs)
+
+    def touch(self, *args, **kwargs):
+        return self.cache.touch(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self.cache.delete(*args, **kwargs)
+
+    def has_key(self, *args, **kwargs):
+        return self.cache.has_key(*args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self.cache.incr(*args, **kwargs)
+
+    def decr(self, *args, **kwargs):
+        return self.cache.decr(*args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        return self.cache.set_many(*args, **kwargs)
+
+    def delete_many(self, *args, **kwargs):
+        return self.cache.delete_many(*args, **kwargs)
+
+    def clear(self):
+        return self.cache.clear()
+
+    def close(self, **kwargs):
+        return self.cache.close(**kwargs)
+
+
+class Histograms:
+    """Гистограммы замеров по именам адресов с периодической выгрузкой."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.flushed = time.monotonic()
+
+    def bucket(self, ms):
+        for bound in settings.METRICS_BUCKETS:
+            if ms <= bound:
+                return str(bound)
+        return 'inf'
+
+    def add(self, name, recorder):
+        with self.lock:
+            for timing, ms in recorder.ms.items():
+                self.pending[(name, timing, self.bucket(ms))] += 1
+                self.pending[(name, timing, 'sum')] += round(ms * 1000)
+            for counter, value in recorder.counts.items():
+                self.pending[(name, counter, 'sum')] += value
+            due = (
+                time.monotonic() - self.flushed
+                >= settings.METRICS_FLUSH_INTERVAL
+            )
+            if not due:
+                return
+            pending, self.pending = self.pending, defaultdict(int)
+            self.flushed = time.monotonic()
+        self.flush(pending)
+
+    def flush(self, pending):
+        cache = caches[settings.METRICS_CACHE]
+        names = cache.get(KEY.format('names')) or set()
+        new_names = {name for name, _, _ in pending} - names
+        if new_names:
+            cache.set(KEY.format('names'), names | new_names, None)
+        for (name, metric, bucket), value in pending.items():
+            key = KEY.format(f'{name}:{metric}:{bucket}')
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.set(key, value, None)
+
+
+histograms = Histograms()
+
+
+def metric_keys(name):
+    buckets = [str(bound) for bound in settings.METRICS_BUCKETS] + ['inf']
+    keys = {
+        timing: [
+            KEY.format(f'{name}:{timing}:{bucket}') for bucket in buckets
+        ]
+        for timing in TIMINGS
+    }
+    sums = {
+        metric: KEY.format(f'{name}:{metric}:sum')
+        for metric in TIMINGS + COUNTERS
+    }
+    return buckets, keys, sums
+
+
+def read(name):
+    """Накопленные замеры адреса: гистограммы и суммы."""
+    buckets, keys, sums = metric_keys(name)
+    values = caches[settings.METRICS_CACHE].get_many(
+        [key for timing in TIMINGS for key in keys[timing]]
+        + list(sums.values())
+    )
+    data = {counter: values.get(sums[counter], 0) for counter in COUNTERS}
+    for timing in TIMINGS:
+        data[timing] = {
+            'buckets': [
+                (bucket, values.get(key, 0))
+                for bucket, key in zip(buckets, keys[timing])
+            ],
+            'sum_ms': values.get(sums[timing], 0) / 1000,
+        }
+    return data
+
+
+def names():
+    cache = caches[settings.METRICS_CACHE]
+    return sorted(cache.get(KEY.format('names')) or ())
+
+
+def reset():
+    keys = [KEY.format('names')]
+    for name in names():
+        _, timing_keys, sums = metric_keys(name)
+        for timing in TIMINGS:
+            keys += timing_keys[timing]
+        keys += sums.values()
+    caches[settings.METRICS_CACHE].delete_many(keys)
+
+
+def percentile(buckets, rank):
+    """Верхняя граница корзины, в которую попадает перцентиль rank."""
+    total = sum(number for _, number in buckets)
+    if not total:
+        return None
+    seen = 0
+    for bound, number in buckets:
+        seen += number
+        if seen * 100 >= total * rank:
+            return bound
+    return buckets[-1][0]
+
+
+def show_timing(request):
+    if settings.METRICS_SERVER_TIMING:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.timer = QueryTimer()
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        recorder = _local.recorder = Recorder()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.timer)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.recorder = None
+        recorder.finish()
+        if show_timing(request):
+            response['Server-Timing'] = recorder.server_timing()
+        match = request.resolver_match
+        name = match.view_name if match else 'unresolved'
+        logger.info(json.dumps({
+            'url_name': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **recorder.as_dict(),
+        }, ensure_ascii=False))
+        histograms.add(name, recorder)
+        return response
@@ -0,0 +1,134 @@
+"""Сессии: гости — в подписанной cookie, пользователи — в кэше и базе.
+
+Сессия гостя (без пользователя auth) целиком хранится в cookie,
+подписанной SECRET_KEY, и не читается из базы и не пишется в нее. После
+входа сессия получает случайный ключ и хранится как в cached_db: чтение
+из кэша SESSION_CACHE_ALIAS, запись сразу в кэш и в django_session, так
+что вход переживает очистку кэша. Ключи различаются по виду: в подписанной
+cookie есть ':', в случайном ключе — нет.
+
+Кэш сессий должен быть общим для воркеров: выход в одном воркере
+не сбросит копию сессии в памяти другого. Если SESSION_CACHE_ALIAS —
+кэш в памяти процесса (locmem), сессии пользователей читаются из базы.
+
+Обращения к django_session и обращения, которые обошлись без базы,
+считаются в замерах запроса (core.metrics: session_db и session_saved).
+Истекшие сессии удаляются из базы пачками командой cleanup_sessions.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.core import signing
+from django.core.cache.backends.dummy import DummyCache
+from django.utils import timezone
+
+from .cache import is_shared
+from .metrics import count
+
+SALT = 'core.sessions'
+
+
+def is_signed(session_key):
+    return session_key is not None and ':' in session_key
+
+
+def delete_expired(batch_size=1000, pause=0):
+    """Удаляет истекшие сессии пачками и возвращает их число.
+
+    Короткие удаления не держат блокировку записи SQLite подолгу.
+    """
+    model = SessionStore.get_model_class()
+    expired = model.objects.filter(expire_date__lt=timezone.now())
+    deleted = 0
+    while True:
+        keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        deleted += model.objects.filter(session_key__in=keys).delete()[0]
+        time.sleep(pause)
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        if not is_shared(settings.CACHES[settings.SESSION_CACHE_ALIAS]):
+            self._cache = DummyCache('', {})
+
+    def is_guest(self):
+        return SESSION_KEY not in self._session
+
+    def load(self):
+        if not is_signed(self.session_key):
+            self.db_reads = 0
+            data = super().load()
+            if not self.db_reads:
+                count('session_saved')
+            return data
+        count('session_saved')
+        try:
+            return signing.loads(
+                self.session_key,
+                salt=SALT,
+                serializer=self.serializer,
+                max_age=settings.SESSION_COOKIE_AGE,
+            )
+        except signing.BadSignature:
+            self._session_key = None
+            return {}
+
+    def _get_session_from_db(self):
+        self.db_reads = getattr(self, 'db_reads', 0) + 1
+        count('session_db')
+        return super()._get_session_from_db()
+
+    def exists(self, session_key):
+        if is_signed(session_key):
+            return False
+        return super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.is_guest():
+            if self.session_key is not None and not is_signed(
+                self.session_key
+            ):
+                # Гость с ключом из базы, например после выхода на другой
+                # вкладке: серверная копия больше не нужна.
+                self.delete()
+            self._session_key = signing.dumps(
+                self._session,
+                salt=SALT,
+                serializer=self.serializer,
+                compress=True,
+            )
+            count('session_saved')
+            return
+        if self.session_key is None or is_signed(self.session_key):
+            self.create()
+            return
+        count('session_db')
+        super().save(must_create)
+
+    def delete(self, session_key=None):
+        key = self.session_key if session_key is None else session_key
+        if key is None or is_signed(key):
+            if session_key is None:
+                self._session_key = None
+            return
+        count('session_db')
+        super().delete(session_key)
+
+    def cycle_key(self):
+        if not self.is_guest():
+            super().cycle_key()
+            return
+        # У гостя ключ — сама cookie: новый получится при сохранении.
+        data = self._session
+        self.delete()
+        self._session_cache = data
+        self.modified = True
+
+    @classmethod
+    def clear_expired(cls):
+        delete_expired()
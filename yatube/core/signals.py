@@ -0,0 +1,20 @@
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import connections, sqlite
+
+
+@receiver(connection_created)
+def count_new_connection(sender, connection, **kwargs):
+    connections.stats.add(opened=1)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    connections.check_connections()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    sqlite.configure(connection)
@@ -0,0 +1,47 @@
+"""Режим SQLite для работы под нагрузкой.
+
+Каждому новому соединению задаются PRAGMA из settings.SQLITE_PRAGMAS:
+журнал WAL (чтение не блокирует запись), synchronous=NORMAL, кэш
+страниц, mmap и ожидание занятой базы.
+
+Писать в SQLite одновременно может только одно соединение. Транзакция,
+которая начала с чтения, при попытке записи не ждет busy_timeout,
+а сразу получает «database is locked», если базу уже пишет другое
+соединение. Поэтому бэкенд core.backends.sqlite3 открывает транзакции
+командой BEGIN IMMEDIATE: блокировка записи берется в начале
+транзакции, и занятую базу транзакция ждет busy_timeout.
+
+Пока база занята, SQLite опрашивает ее с паузами, и при многих
+ожидающих кому-то из них может не достаться очереди за все время
+ожидания. Поэтому потоки одного процесса перед BEGIN встают в очередь
+на write_lock файла базы. Блокировка держится только до COMMIT или
+ROLLBACK, а не весь запрос.
+"""
+import threading
+
+from django.conf import settings
+from django.db import OperationalError
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def configure(connection):
+    """Задает PRAGMA новому соединению SQLite."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def write_lock(name):
+    """Блокировка записи в файл базы name для потоков процесса."""
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def acquire(lock):
+    timeout = settings.SQLITE_PRAGMAS.get('busy_timeout', 0) / 1000
+    if not lock.acquire(timeout=timeout):
+        raise OperationalError('database is locked')
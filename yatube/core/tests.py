@@ -1,8 +1,35 @@
+import asyncio
+import json
 import shutil
 import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
-from django.test import Client, TestCase
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connection as db_connection
+from django.db import connections as db_connections
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.bench import WriteStress
+from posts.models import Comment, Post, User
+
+from . import connections, metrics, sessions, sqlite
+from .asgi import WsgiToAsgi
+from .backends.sqlite3.base import DatabaseWrapper
+from .db import ReplicaMiddleware, ReplicaRouter
+from .cache import cache_config, instrumented
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -22,3 +49,561 @@ class ViewsTests(TestCase):
         """Несуществующая страница получает кастомный шаблон"""
         response = self.guest_client.get('/unexisting_page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheConfigTests(SimpleTestCase):
+    def test_cache_url_is_parsed(self):
+        """Адрес кэша превращается в настройки бэкенда"""
+        urls = {
+            'redis://cache:6379/1': (
+                'django_redis.cache.RedisCache', 'redis://cache:6379/1'
+            ),
+            'file:///var/tmp/yatube': (
+                'django.core.cache.backends.filebased.FileBasedCache',
+                '/var/tmp/yatube',
+            ),
+            'db://yatube_cache': (
+                'django.core.cache.backends.db.DatabaseCache', 'yatube_cache'
+            ),
+            'locmem://': (
+                'django.core.cache.backends.locmem.LocMemCache', ''
+            ),
+        }
+        for url, (backend, location) in urls.items():
+            with self.subTest(url=url):
+                config = cache_config(url)
+                self.assertEqual(config['BACKEND'], backend)
+                self.assertEqual(config['LOCATION'], location)
+
+    def test_unknown_cache_url(self):
+        """Неизвестный бэкенд кэша вызывает ошибку"""
+        with self.assertRaises(ValueError):
+            cache_config('memcached://localhost')
+
+    def test_instrumented_wraps_config(self):
+        """Прокси замеров оборачивает настройку исходного кэша"""
+        config = instrumented(cache_config('locmem://'))
+        self.assertEqual(config['BACKEND'], 'core.metrics.InstrumentedCache')
+        self.assertEqual(
+            config['OPTIONS']['backend'], cache_config('locmem://')
+        )
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит заголовок Server-Timing с замерами"""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for name in ('db;dur=', 'tpl;dur=', 'thumb;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'SQL x[1-9]')
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_server_timing_only_for_staff(self):
+        """Без METRICS_SERVER_TIMING заголовок получает только персонал"""
+        url = reverse('posts:index')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        user = User.objects.create_user(username='reader')
+        self.client.force_login(user)
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        user.is_staff = True
+        user.save()
+        self.assertIn('Server-Timing', self.client.get(url))
+
+    def test_log_line(self):
+        """Замеры пишутся в лог строкой JSON"""
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['url_name'], 'posts:index')
+        self.assertEqual(data['status'], 200)
+        self.assertGreater(data['queries'], 0)
+        self.assertGreater(data['template_ms'], 0)
+
+    def test_cache_hits_and_misses(self):
+        """Прокси кэша считает попадания и промахи фрагментов"""
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+        first, second = (
+            json.loads(record.getMessage()) for record in logs.records
+        )
+        self.assertGreater(first['cache_misses'], 0)
+        self.assertEqual(second['cache_misses'], 0)
+        self.assertGreater(second['cache_hits'], 0)
+
+    def test_show_metrics(self):
+        """Команда show_metrics выводит гистограммы по именам адресов"""
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        self.client.get('/unexisting_page/')
+        out = StringIO()
+        call_command('show_metrics', stdout=out)
+        self.assertIn('posts:index: запросов 3', out.getvalue())
+        self.assertIn('unresolved: запросов 1', out.getvalue())
+        call_command('show_metrics', reset=True, stdout=StringIO())
+        out = StringIO()
+        call_command('show_metrics', stdout=out)
+        self.assertIn('Замеров пока нет', out.getvalue())
+
+    def test_percentile(self):
+        """Перцентиль берется по верхней границе корзины"""
+        buckets = [('5', 50), ('10', 45), ('25', 5), ('inf', 0)]
+        self.assertEqual(metrics.percentile(buckets, 50), '5')
+        self.assertEqual(metrics.percentile(buckets, 95), '10')
+        self.assertEqual(metrics.percentile(buckets, 99), '25')
+        self.assertIsNone(metrics.percentile([('5', 0)], 50))
+
+
+def echo(environ, start_response):
+    """WSGI-приложение, которое возвращает разобранный запрос."""
+    start_response('201 Created', [('Content-Type', 'application/json')])
+    yield json.dumps({
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'].encode('latin1').decode(),
+        'query': environ['QUERY_STRING'],
+        'type': environ['CONTENT_TYPE'],
+        'accept': environ['HTTP_ACCEPT'],
+        'body': environ['wsgi.input'].read().decode(),
+    }).encode()
+
+
+def call(application, scope, messages):
+    """Выполняет ASGI-приложение и возвращает отправленные сообщения."""
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return sent
+
+
+class AsgiTests(SimpleTestCase):
+    def test_request_and_response(self):
+        """Запрос ASGI доходит до WSGI-приложения, ответ — до клиента"""
+        application = WsgiToAsgi(echo, threads=1)
+        sent = call(
+            application,
+            {
+                'type': 'http',
+                'method': 'POST',
+                'path': '/профиль/',
+                'query_string': b'page=2',
+                'headers': [
+                    (b'content-type', b'text/plain'),
+                    (b'accept', b'text/html'),
+                    (b'accept', b'application/json'),
+                ],
+            },
+            [
+                {'type': 'http.request', 'body': b'one ', 'more_body': True},
+                {'type': 'http.request', 'body': b'two'},
+            ],
+        )
+        application.executor.shutdown()
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertIn(
+            (b'content-type', b'application/json'), sent[0]['headers']
+        )
+        self.assertEqual(json.loads(sent[1]['body']), {
+            'method': 'POST',
+            'path': '/профиль/',
+            'query': 'page=2',
+            'type': 'text/plain',
+            'accept': 'text/html,application/json',
+            'body': 'one two',
+        })
+        self.assertEqual(sent[-1], {'type': 'http.response.body', 'body': b''})
+
+    def test_disconnect_skips_view(self):
+        """Если клиент ушел, не дослав тело, view не вызывается"""
+        application = mock.Mock()
+        sent = call(
+            WsgiToAsgi(application, threads=1),
+            {'type': 'http', 'method': 'POST', 'path': '/create/'},
+            [
+                {'type': 'http.request', 'body': b'text=A', 'more_body': True},
+                {'type': 'http.disconnect'},
+            ],
+        )
+        application.assert_not_called()
+        self.assertEqual(sent, [])
+
+    def test_streaming_response(self):
+        """Потоковый ответ отдается по частям, пока они создаются"""
+        sent = []
+
+        def stream(environ, start_response):
+            start_response('200 OK', [])
+            yield b'one'
+            # Первая часть ушла клиенту до того, как создана вторая.
+            yield str(len(sent)).encode()
+
+        application = WsgiToAsgi(stream, threads=1)
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application(
+            {'type': 'http', 'method': 'GET', 'path': '/'}, receive, send
+        ))
+        application.executor.shutdown()
+        self.assertEqual(
+            [message.get('body') for message in sent],
+            [None, b'one', b'2', b''],
+        )
+
+    def test_lifespan(self):
+        """Приложение отвечает на события запуска и остановки"""
+        sent = call(
+            WsgiToAsgi(echo),
+            {'type': 'lifespan'},
+            [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+        )
+        self.assertEqual(
+            [message['type'] for message in sent],
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+
+class AsgiDjangoTests(TransactionTestCase):
+    def test_django_page(self):
+        """Страница Django отдается через ASGI"""
+        application = WsgiToAsgi(get_wsgi_application(), threads=2)
+        sent = call(
+            application,
+            {
+                'type': 'http',
+                'method': 'GET',
+                'path': reverse('about:author'),
+                'headers': [(b'host', b'testserver')],
+            },
+            [{'type': 'http.request', 'body': b''}],
+        )
+        application.executor.shutdown()
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn(b'<html', body)
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'], REPLICA_COOKIE='primary')
+class ReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def respond(self, request, write=False):
+        def view(request):
+            reads = [self.router.db_for_read(Post)]
+            if write:
+                self.router.db_for_write(Post)
+                reads.append(self.router.db_for_read(Post))
+            return HttpResponse(','.join(reads))
+        return ReplicaMiddleware(view)(request)
+
+    def test_reads_go_to_replica(self):
+        """Чтение постов идет на реплику, запись — в основную базу"""
+        response = self.respond(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica0')
+        self.assertNotIn('primary', response.cookies)
+
+    def test_write_pins_to_primary(self):
+        """После записи чтение и следующие запросы идут в основную базу"""
+        response = self.respond(self.factory.post('/'), write=True)
+        self.assertEqual(response.content, b'replica0,default')
+        self.assertEqual(response.cookies['primary']['max-age'], 10)
+        request = self.factory.get('/')
+        request.COOKIES['primary'] = '1'
+        self.assertEqual(self.respond(request).content, b'default')
+        # Закрепление не переходит на следующие запросы потока.
+        self.assertEqual(
+            self.respond(self.factory.get('/')).content, b'replica0'
+        )
+
+    @override_settings(DATABASE_REPLICAS=['replica0', 'replica1'])
+    def test_one_replica_per_request(self):
+        """Все чтения запроса идут на одну реплику"""
+        def view(request):
+            return HttpResponse(','.join(
+                self.router.db_for_read(Post) for _ in range(20)
+            ))
+        seen = set()
+        for _ in range(20):
+            response = ReplicaMiddleware(view)(self.factory.get('/'))
+            reads = set(response.content.decode().split(','))
+            self.assertEqual(len(reads), 1)
+            seen |= reads
+        self.assertEqual(seen, {'replica0', 'replica1'})
+
+    def test_unrouted_apps_and_migrations(self):
+        """Сессии не читаются с реплик, а реплики не мигрируются"""
+        self.assertIsNone(self.router.db_for_read(Session))
+        self.assertFalse(self.router.allow_migrate('replica0', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_pool_timeout(self):
+        """Занятый пул отказывает по истечении ожидания"""
+        pool = connections.ConnectionPool(1, timeout=0.01)
+        pool.acquire()
+        with self.assertRaises(connections.PoolTimeout):
+            pool.acquire()
+        pool.release()
+        pool.acquire()
+        pool.release()
+
+    @override_settings(DATABASE_POOL_SIZE=1, DATABASE_POOL_TIMEOUT=0.01)
+    def test_middleware_answers_503(self):
+        """Запрос сверх размера пула получает ответ 503"""
+        responses = []
+
+        def view(request):
+            responses.append(middleware(request))
+            return HttpResponse()
+
+        middleware = connections.ConnectionPoolMiddleware(view)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(responses[0].status_code, 503)
+        self.assertEqual(responses[0]['Retry-After'], '1')
+
+    def test_unusable_connection_is_closed(self):
+        """Оборванное соединение закрывается перед запросом"""
+        connection = mock.Mock(connection=object())
+        connection.is_usable.return_value = False
+        with mock.patch.object(
+            connections.connections, 'all', return_value=[connection]
+        ):
+            dropped = connections.stats.snapshot().get('dropped', 0)
+            connections.check_connections()
+        connection.close.assert_called_once()
+        self.assertEqual(
+            connections.stats.snapshot()['dropped'], dropped + 1
+        )
+
+    def test_worker_stats_in_show_metrics(self):
+        """Счетчики воркера видны в show_metrics"""
+        self.client.get(reverse('about:author'))
+        connections.stats.flush(force=True)
+        out = StringIO()
+        call_command('show_metrics', stdout=out)
+        self.assertIn('Воркер', out.getvalue())
+        call_command('show_metrics', reset=True, stdout=StringIO())
+        self.assertEqual(connections.read(), [])
+
+    def test_workers_take_own_slots(self):
+        """Воркеры пишут счетчики в свои ячейки, истекшая освобождается"""
+        connections.reset()
+        parent = connections.WorkerStats()
+        with mock.patch('os.getpid', return_value=1):
+            parent.flush(force=True)
+        # Потомок после fork наследует номер ячейки родителя.
+        child = connections.WorkerStats()
+        child.slot = parent.slot
+        with mock.patch('os.getpid', return_value=2):
+            child.flush(force=True)
+        self.assertNotEqual(child.slot, parent.slot)
+        self.assertEqual(
+            [worker['pid'] for worker in connections.read()], [1, 2]
+        )
+        cache.delete(connections.SLOT_KEY.format(parent.slot))
+        self.assertEqual(
+            [worker['pid'] for worker in connections.read()], [2]
+        )
+        connections.reset()
+
+
+class SqliteTests(TestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение получает PRAGMA из настроек"""
+        with db_connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_transaction_takes_write_lock(self):
+        """Транзакция в базе-файле берет блокировку записи до COMMIT"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        name = f'{directory}/lock.sqlite3'
+        connection = DatabaseWrapper(
+            {**db_connections.databases['default'], 'NAME': name}, 'lock'
+        )
+        self.addCleanup(connection.close)
+        lock = sqlite.write_lock(name)
+        with CaptureQueriesContext(connection) as queries:
+            connection._start_transaction_under_autocommit()
+        self.assertEqual(queries[-1]['sql'], 'BEGIN IMMEDIATE')
+        self.assertTrue(lock.locked())
+        connection._commit()
+        self.assertFalse(lock.locked())
+        connection._start_transaction_under_autocommit()
+        connection._rollback()
+        self.assertFalse(lock.locked())
+        with self.settings(SQLITE_TUNING=False):
+            connection._start_transaction_under_autocommit()
+            self.assertFalse(lock.locked())
+            connection._rollback()
+
+
+class SqliteStressTests(SimpleTestCase):
+    """Одновременная запись и чтение в файловой базе.
+
+    Тестовая база хранится в памяти, поэтому нагрузка идет в отдельном
+    потоке, соединения которого открывают временный файл. Без BEGIN
+    IMMEDIATE при таких числах часть записей падает с «database is
+    locked».
+    """
+
+    writers = readers = 16
+    requests = 15
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        patcher = mock.patch.dict(
+            db_connections.databases['default'],
+            NAME=f'{directory}/stress.sqlite3',
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def stress(self):
+        try:
+            call_command('migrate', verbosity=0)
+            author = User.objects.create_user(username='author')
+            Post.objects.bulk_create(
+                Post(author=author, text=f'Пост {number}')
+                for number in range(5)
+            )
+            User.objects.bulk_create(
+                User(username=f'writer{number}')
+                for number in range(self.writers)
+            )
+            self.counts = WriteStress(
+                self.writers, self.readers, self.requests
+            ).run()
+            self.comments = Comment.objects.count()
+        finally:
+            db_connections.close_all()
+
+    def test_no_failed_requests(self):
+        """Под нагрузкой ни запись, ни чтение не падают"""
+        thread = threading.Thread(target=self.stress)
+        thread.start()
+        thread.join()
+        self.assertEqual(self.counts, {
+            'writes': self.writers * self.requests,
+            'reads': self.readers * self.requests,
+        })
+        # Каждый запрос выполнился один раз: повторов view нет.
+        self.assertEqual(self.comments, self.writers * self.requests)
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def respond(self, cookie=None, **values):
+        def view(request):
+            request.session.update(values)
+            return HttpResponse(request.session.get('seen', ''))
+
+        request = RequestFactory().get('/')
+        if cookie is not None:
+            request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+        return SessionMiddleware(view)(request)
+
+    def test_guest_session_lives_in_cookie(self):
+        """Сессия гостя хранится в подписанной cookie, а не в базе"""
+        response = self.respond(seen='да')
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertTrue(sessions.is_signed(cookie))
+        self.assertFalse(Session.objects.exists())
+        with self.assertNumQueries(0):
+            response = self.respond(cookie)
+        self.assertEqual(response.content.decode(), 'да')
+        response = self.respond(cookie[:-1] + 'x')
+        self.assertEqual(response.content, b'')
+
+    def shared_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        return self.settings(CACHES={
+            'default': instrumented(cache_config(f'file://{directory}')),
+        })
+
+    def test_user_session_is_read_from_cache(self):
+        """Сессия пользователя пишется в базу, а читается из кэша"""
+        with self.shared_cache():
+            user = User.objects.create_user(username='user')
+            self.client.force_login(user)
+            self.assertEqual(Session.objects.count(), 1)
+            with self.assertLogs('core.metrics', 'INFO') as logs:
+                self.client.get(reverse('posts:follow_index'))
+            data = json.loads(logs.records[0].getMessage())
+            self.assertEqual(
+                (data['session_db'], data['session_saved']), (0, 1)
+            )
+            cache.clear()
+            with self.assertLogs('core.metrics', 'INFO') as logs:
+                response = self.client.get(reverse('posts:follow_index'))
+            self.assertEqual(response.context['user'], user)
+            data = json.loads(logs.records[0].getMessage())
+            self.assertEqual(data['session_db'], 1)
+            self.client.logout()
+            self.assertFalse(Session.objects.exists())
+
+    def test_local_cache_is_not_used(self):
+        """С кэшем в памяти процесса сессия пользователя читается из базы"""
+        user = User.objects.create_user(username='user')
+        self.client.force_login(user)
+        for _ in range(2):
+            with self.assertLogs('core.metrics', 'INFO') as logs:
+                self.client.get(reverse('posts:follow_index'))
+            data = json.loads(logs.records[0].getMessage())
+            self.assertEqual(data['session_db'], 1)
+        # Выход «в другом воркере»: строки в базе больше нет.
+        Session.objects.all().delete()
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_cleanup_sessions(self):
+        """cleanup_sessions удаляет только истекшие сессии"""
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(
+                session_key=f'expired{number:03d}',
+                session_data='',
+                expire_date=now - timedelta(days=1),
+            )
+            for number in range(5)
+        )
+        Session.objects.create(
+            session_key='alive0000',
+            session_data='',
+            expire_date=now + timedelta(days=1),
+        )
+        out = StringIO()
+        call_command('cleanup_sessions', batch_size=2, stdout=out)
+        self.assertIn('Удалено истекших сессий: 5', out.getvalue())
+        self.assertEqual(
+            list(Session.objects.values_list('session_key', flat=True)),
+            ['alive0000'],
+        )
@@ -1,9 +1,21 @@
 from django.contrib import admin
+from search.engines import COMMENT, POST, get_engine
 
-from .models import Group, Post, Comment
+from .models import Group, Post, Comment, ThumbnailJob
 
 
-class PostAdmin(admin.ModelAdmin):
+class IndexedSearchMixin:
+    """Поиск в админке по индексу search вместо LIKE по таблице."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        found = get_engine().match(search_term, self.search_kind)
+        return queryset.filter(pk__in=found), False
+
+
+class PostAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,11 +24,37 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     search_fields = ('text',)
+    search_kind = POST
     list_editable = ('group',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
 
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'text',
+        'created',
+        'author',
+        'post',
+    )
+    search_fields = ('text',)
+    search_kind = COMMENT
+    list_select_related = ('author', 'post')
+
+
+class ThumbnailJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'source',
+        'status',
+        'attempts',
+        'updated',
+    )
+    list_filter = ('status',)
+    search_fields = ('source',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
-admin.site.register(Comment)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(ThumbnailJob, ThumbnailJobAdmin)
@@ -0,0 +1,486 @@
+"""Нагрузочные замеры страниц постов.
+
+generate() наполняет базу воспроизводимым набором данных: одинаковые
+seed и размеры дают одинаковые пользователей, группы, посты, комментарии
+и подписки. Строки пишутся через bulk_create пачками, а производные
+данные (счетчики, ленты подписок, поисковый индекс) строятся после.
+
+measure() обходит страницы index, group_posts, profile, post_detail
+и follow_index тестовым клиентом и собирает задержки и число запросов
+к базе; report() сводит их в перцентили p50/p95/p99.
+
+connection_overhead() замеряет запросы с постоянными соединениями
+и без них, а slow_clients() сравнивает, сколько медленных клиентов успевают
+обслужить WSGI-воркеры и ASGI-приложение core.asgi при одном числе
+потоков. WriteStress нагружает базу одновременной записью и чтением.
+
+template_times() замеряет отрисовку шаблонов лент без кэширующего
+загрузчика и кэша карточек постов и с ними.
+"""
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from core import connections as db_connections
+from core.asgi import WsgiToAsgi, environ
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import feed
+from .constants import POSTS_PER_PAGE
+from .models import Comment, Follow, Group, Post, User
+from .utils import auto_now_add_disabled, batches, render_text
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+CARD_VIEWS = ('index', 'group_posts', 'profile', 'follow_index')
+PERCENTILES = (50, 95, 99)
+USERNAME = 'bench{:07d}'
+SENTENCES = 1000
+SAMPLE_POOL = 1000
+
+
+class Generator:
+    def __init__(self, seed=0, batch_size=10000, stdout=None):
+        self.random = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout or StringIO()
+        self.now = timezone.now()
+        self.sentences = [self.faker.sentence() for _ in range(SENTENCES)]
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def text(self, sentences):
+        return ' '.join(self.random.choices(self.sentences, k=sentences))
+
+    def rendered(self, obj):
+        # bulk_create обходит save(), который заполняет text_html.
+        obj.text_html = render_text(obj.text)
+        return obj
+
+    def save(self, model, objects, **kwargs):
+        created = 0
+        for batch in batches(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {created}')
+
+    def ids(self, model):
+        return list(model.objects.values_list('pk', flat=True))
+
+    def run(self, users, groups, posts, comments, follows):
+        first = User.objects.count()
+        self.save(User, (
+            User(
+                username=USERNAME.format(first + i),
+                first_name=self.faker.first_name(),
+                last_name=self.faker.last_name(),
+                password='!',
+            )
+            for i in range(users)
+        ))
+        first = Group.objects.count()
+        self.save(Group, (
+            Group(
+                title=self.faker.catch_phrase()[:200],
+                slug=f'bench-{first + i}',
+                description=self.text(2),
+            )
+            for i in range(groups)
+        ))
+        user_ids = self.ids(User)
+        group_ids = self.ids(Group) + [None]
+        # Посты раз в минуту в прошлое от текущего момента.
+        with auto_now_add_disabled(Post._meta.get_field('pub_date')):
+            self.save(Post, (
+                self.rendered(Post(
+                    text=self.text(self.random.randint(1, 5)),
+                    author_id=self.random.choice(user_ids),
+                    group_id=self.random.choice(group_ids),
+                    pub_date=self.now - timedelta(minutes=i),
+                ))
+                for i in range(posts)
+            ))
+        post_ids = self.ids(Post)
+        with auto_now_add_disabled(Comment._meta.get_field('created')):
+            self.save(Comment, (
+                self.rendered(Comment(
+                    post_id=self.random.choice(post_ids),
+                    author_id=self.random.choice(user_ids),
+                    text=self.text(1),
+                    created=self.now - timedelta(seconds=i),
+                ))
+                for i in range(comments)
+            ))
+        self.save(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in self.follow_pairs(user_ids, follows)
+        ), ignore_conflicts=True)
+        feed.rebuild(self.batch_size)
+        call_command(
+            'recount_stats', batch_size=self.batch_size, stdout=self.stdout
+        )
+        call_command('rebuild_search_index', stdout=self.stdout)
+
+    def follow_pairs(self, user_ids, follows):
+        for user_id in user_ids:
+            authors = self.random.sample(
+                user_ids, min(follows, len(user_ids))
+            )
+            for author_id in authors:
+                if author_id != user_id:
+                    yield user_id, author_id
+
+
+def generate(users, groups, posts, comments, follows, seed=0,
+             batch_size=10000, stdout=None):
+    Generator(seed, batch_size, stdout).run(
+        users, groups, posts, comments, follows
+    )
+
+
+def sample_urls(count, seed=0):
+    """Адреса страниц каждого вида для замеров, одинаковые при одном seed.
+
+    Для follow_index вместе с адресом возвращается читатель, от имени
+    которого запрашивается лента.
+    """
+    rng = random.Random(seed)
+
+    def pick(queryset):
+        ids = list(queryset.values_list('pk', flat=True)[:SAMPLE_POOL])
+        return rng.choices(ids, k=count) if ids else []
+
+    authors = pick(User.objects.filter(posts__isnull=False).distinct())
+    usernames = dict(
+        User.objects.filter(pk__in=authors).values_list('pk', 'username')
+    )
+    readers = User.objects.filter(follower__isnull=False).distinct()
+    slugs = dict(Group.objects.values_list('pk', 'slug'))
+    pages = max(1, math.ceil(Post.objects.count() / POSTS_PER_PAGE))
+    return {
+        'index': [
+            (reverse('posts:index') + f'?page={rng.randint(1, pages)}', None)
+            for _ in range(count)
+        ],
+        'group_posts': [
+            (reverse('posts:group_list', args=(slugs[pk],)), None)
+            for pk in pick(Group.objects.filter(posts__isnull=False))
+        ],
+        'profile': [
+            (reverse('posts:profile', args=(usernames[pk],)), None)
+            for pk in authors
+        ],
+        'post_detail': [
+            (reverse('posts:post_detail', args=(pk,)), None)
+            for pk in pick(Post.objects.all())
+        ],
+        'follow_index': [
+            (reverse('posts:follow_index'), pk) for pk in pick(readers)
+        ],
+    }
+
+
+def login(client, user_id):
+    if user_id is None:
+        client.logout()
+    else:
+        client.force_login(User.objects.get(pk=user_id))
+
+
+def measure(urls, cold=False):
+    """Запрашивает адреса и возвращает пары (секунды, число запросов)."""
+    client = Client()
+    samples = []
+    for url, user_id in urls:
+        login(client, user_id)
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        samples.append((elapsed, len(queries)))
+    return samples
+
+
+def template_times(urls, cached):
+    """Время отрисовки шаблонов каждой страницы в мс (из Server-Timing).
+
+    Кэш фрагментов страниц выключен, чтобы шаблон отрисовывался при каждом
+    запросе. cached включает кэширующий загрузчик шаблонов и кэш карточек
+    постов, иначе шаблоны читаются с диска, а карточки отрисовываются
+    заново.
+    """
+    loaders = settings.TEMPLATE_LOADERS
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    engine = settings.TEMPLATES[0]
+    templates = [
+        {**engine, 'OPTIONS': {**engine['OPTIONS'], 'loaders': loaders}}
+    ]
+    client = Client()
+    times = []
+    with override_settings(
+        TEMPLATES=templates,
+        VIEW_CACHE_POLICIES={},
+        POST_CARD_TIMEOUT=settings.POST_CARD_TIMEOUT if cached else 0,
+        METRICS_SERVER_TIMING=True,
+    ):
+        cache.clear()
+        for url, user_id in urls:
+            login(client, user_id)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url}: ответ {response.status_code}')
+            timing = re.search(r'tpl;dur=([\d.]+)', response['Server-Timing'])
+            times.append(float(timing.group(1)))
+    return times
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, math.ceil(rank / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def report(samples):
+    """Сводка замеров: перцентили задержки в мс и наибольшее число запросов."""
+    latencies = [elapsed * 1000 for elapsed, _ in samples]
+    summary = {
+        f'p{rank}': round(percentile(latencies, rank), 2)
+        for rank in PERCENTILES
+    }
+    summary['queries'] = max(queries for _, queries in samples)
+    summary['requests'] = len(samples)
+    return summary
+
+
+def regressions(results, baseline, tolerance):
+    """Отклонения от сохраненной базовой линии.
+
+    Задержка p95 может превышать базовую не больше чем в (1 + tolerance)
+    раз, число запросов к базе расти не должно.
+    """
+    problems = []
+    for view, summary in results.items():
+        base = baseline.get(view)
+        if base is None:
+            continue
+        if summary['p95'] > base['p95'] * (1 + tolerance):
+            problems.append(
+                f'{view}: p95 {summary["p95"]} мс > {base["p95"]} мс'
+            )
+        if summary['queries'] > base['queries']:
+            problems.append(
+                f'{view}: запросов {summary["queries"]} > {base["queries"]}'
+            )
+    return problems
+
+
+def http_scope(url):
+    path, _, query = url.partition('?')
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'testserver')],
+        'server': ('testserver', 80),
+    }
+
+
+def slow_wsgi(application, url, delay):
+    """Запрос к WSGI: поток занят, пока клиент читает ответ."""
+    statuses = []
+    response = application(
+        environ(http_scope(url), StringIO()),
+        lambda status, headers, exc_info=None: statuses.append(status),
+    )
+    try:
+        for _ in response:
+            pass
+        time.sleep(delay)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def slow_asgi(application, url, delay):
+    """Запрос к ASGI: ответ медленно читает цикл событий, а не поток."""
+    statuses = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+            await asyncio.sleep(delay)
+
+    await application(http_scope(url), receive, send)
+    return statuses[0]
+
+
+def slow_clients(mode, urls, workers, delay):
+    """Обслуживает адреса разом и возвращает (общее время, задержки).
+
+    Каждый клиент читает ответ delay секунд; на view отводится
+    workers потоков.
+    """
+    application = get_wsgi_application()
+    started = time.perf_counter()
+
+    def finished(status):
+        if status != 200:
+            raise RuntimeError(f'ответ {status}')
+        return time.perf_counter() - started
+
+    if mode == 'wsgi':
+        def client(url):
+            return finished(slow_wsgi(application, url, delay))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            latencies = list(executor.map(client, urls))
+    else:
+        application = WsgiToAsgi(application, threads=workers)
+
+        async def client(url):
+            return finished(await slow_asgi(application, url, delay))
+
+        async def clients():
+            return await asyncio.gather(*(client(url) for url in urls))
+
+        latencies = asyncio.run(clients())
+        application.executor.shutdown()
+    return time.perf_counter() - started, latencies
+
+
+def connection_overhead(urls, max_age):
+    """Задержки запросов (с) и число открытых соединений при CONN_MAX_AGE.
+
+    Запросы идут через WSGI-обработчик, как на сервере: тестовый клиент
+    не закрывает соединения между запросами.
+    """
+    application = get_wsgi_application()
+    previous = {}
+    for alias in connections:
+        connections[alias].close()
+        previous[alias] = connections[alias].settings_dict['CONN_MAX_AGE']
+        connections[alias].settings_dict['CONN_MAX_AGE'] = max_age
+    opened = db_connections.stats.snapshot().get('opened', 0)
+    latencies = []
+    try:
+        for url in urls:
+            started = time.perf_counter()
+            status = slow_wsgi(application, url, 0)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                raise RuntimeError(f'{url}: ответ {status}')
+    finally:
+        for alias, value in previous.items():
+            connections[alias].close()
+            connections[alias].settings_dict['CONN_MAX_AGE'] = value
+    return latencies, db_connections.stats.snapshot()['opened'] - opened
+
+
+class WriteStress:
+    """Смешанная нагрузка на запись комментариев и чтение страниц.
+
+    writers потоков отправляют add_comment от разных пользователей,
+    readers потоков читают страницы постов, каждый по requests запросов.
+    """
+
+    def __init__(self, writers, readers, requests, seed=0):
+        rng = random.Random(seed)
+        post_ids = list(
+            Post.objects.values_list('pk', flat=True)[:SAMPLE_POOL]
+        )
+        users = list(User.objects.all()[:writers])
+        if not post_ids or len(users) < writers:
+            raise RuntimeError('Недостаточно данных для нагрузки')
+        self.writers = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            self.writers.append((
+                client,
+                [
+                    reverse('posts:add_comment', args=(rng.choice(post_ids),))
+                    for _ in range(requests)
+                ],
+            ))
+        self.readers = readers
+        self.urls = [
+            url for url, _ in sample_urls(requests, seed)['post_detail']
+        ]
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.start = threading.Barrier(len(self.writers) + readers)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def request(self, send, ok_status, name):
+        try:
+            status = send().status_code
+        except OperationalError:
+            status = None
+        self.count(name if status == ok_status else f'{name}_failed')
+
+    def write(self, client, urls):
+        self.start.wait()
+        try:
+            for url in urls:
+                self.request(
+                    lambda: client.post(url, {'text': 'Нагрузка'}),
+                    302,
+                    'writes',
+                )
+        finally:
+            connections.close_all()
+
+    def read(self):
+        client = Client()
+        self.start.wait()
+        try:
+            for url in self.urls:
+                self.request(lambda: client.get(url), 200, 'reads')
+        finally:
+            connections.close_all()
+
+    def run(self):
+        """Возвращает счетчики удачных и неудачных записей и чтений."""
+        threads = [
+            threading.Thread(target=self.write, args=writer)
+            for writer in self.writers
+        ] + [
+            threading.Thread(target=self.read) for _ in range(self.readers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return dict(self.counts)
@@ -0,0 +1,178 @@
+"""Кэш фрагментов страниц с версионированием по пространствам имен.
+
+Каждая страница зависит от нескольких пространств имен: 'index',
+'group:<pk>', 'profile:<pk>', 'post:<pk>', 'follow:<pk>'. Их версии входят
+в ключ фрагмента, а сигналы изменения постов, комментариев, подписок
+и групп после фиксации транзакции сдвигают версии затронутых
+пространств. Поэтому фрагменты можно хранить долго: после изменения
+страница сразу собирается заново.
+
+Карточки постов в лентах кэшируются еще и по отдельности (post_cards):
+когда новый пост сбрасывает страницу ленты, остальные карточки на ней
+берутся из кэша готовыми.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+VERSION_KEY = 'cache-version:{}'
+CARD_KEY = 'post-card:{}:{}:{}:{}'
+
+
+def new_version():
+    # Версия — момент изменения: если ключ версии вытеснен из кэша,
+    # новая версия не совпадет ни с одной из прежних.
+    return time.time_ns() // 1000
+
+
+def get_versions(*namespaces):
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*namespaces):
+    """Сдвигает версии пространств имен, сбрасывая их фрагменты."""
+    version = new_version()
+    cache.set_many(
+        {
+            VERSION_KEY.format(namespace): version
+            for namespace in namespaces if namespace is not None
+        },
+        timeout=None,
+    )
+
+
+def bump_on_commit(*namespaces):
+    """bump после фиксации текущей транзакции.
+
+    Если сдвинуть версию до фиксации, параллельный читатель увидит новую
+    версию, но еще старые строки и сохранит под новой версией устаревший
+    фрагмент. Вне транзакции bump выполняется сразу.
+    """
+    transaction.on_commit(lambda: bump(*namespaces))
+
+
+def etag(request, *namespaces):
+    """ETag ответа по версиям пространств имен, без запросов к базе.
+
+    В тег входят адрес с параметрами и пользователь: ответы разным
+    пользователям на одном адресе могут различаться.
+    """
+    versions = get_versions(*(name for name in namespaces if name))
+    payload = f'{request.get_full_path()}:{request.user.pk}:{versions}'
+    return '"{}"'.format(hashlib.md5(payload.encode()).hexdigest())
+
+
+def last_modified(*namespaces):
+    """Момент последнего изменения данных пространств имен.
+
+    Версия — время изменения в микросекундах, поэтому самая новая из них
+    не раньше публикации последнего поста или комментария страницы.
+    """
+    versions = get_versions(*(name for name in namespaces if name))
+    return datetime.fromtimestamp(max(versions) / 10 ** 6, timezone.utc)
+
+
+def conditional_page(namespaces):
+    """Условный GET страницы: ответ 304 до выборки данных и шаблонов.
+
+    namespaces(request, *args, **kwargs) возвращает пространства имен
+    страницы или None, если объекта нет: тогда проверка пропускается,
+    и view сам отвечает 404.
+    """
+    def page_namespaces(request, *args, **kwargs):
+        if not hasattr(request, 'page_namespaces'):
+            request.page_namespaces = namespaces(request, *args, **kwargs)
+        return request.page_namespaces
+
+    def etag_func(request, *args, **kwargs):
+        names = page_namespaces(request, *args, **kwargs)
+        return None if names is None else etag(request, *names)
+
+    def last_modified_func(request, *args, **kwargs):
+        names = page_namespaces(request, *args, **kwargs)
+        return None if names is None else last_modified(*names)
+
+    return condition(etag_func, last_modified_func)
+
+
+def post_namespaces(post_id, author_id, group_id):
+    """Пространства имен страниц, на которых показан пост."""
+    return (
+        'index',
+        f'post:{post_id}',
+        f'profile:{author_id}',
+        f'group:{group_id}' if group_id else None,
+    )
+
+
+def cache_policy(request, view_name, *namespaces):
+    """Параметры кэша фрагментов страницы для шаблонного тега cache.
+
+    Ключ различает гостей и авторизованных пользователей, а для страниц
+    с per_user — и самих пользователей; в него входят версии namespaces.
+    """
+    policy = settings.VIEW_CACHE_POLICIES.get(view_name, {})
+    user = request.user
+    variant = 'authenticated' if user.is_authenticated else 'anonymous'
+    timeout = policy.get(variant, 0)
+    if not timeout:
+        return {'timeout': 0, 'key': ''}
+    key = variant
+    if policy.get('per_user') and user.is_authenticated:
+        key = f'{variant}:{user.pk}'
+    versions = '.'.join(str(version) for version in get_versions(*namespaces))
+    return {
+        'timeout': timeout,
+        'key': f'{key}:{versions}:{request.get_full_path()}',
+    }
+
+
+def card_key(post, version, language):
+    # Имя автора и адрес группы меняются без сдвига версии поста,
+    # поэтому входят в ключ сами.
+    shown = '|'.join((
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    ))
+    digest = hashlib.md5(shown.encode()).hexdigest()
+    return CARD_KEY.format(post.pk, version, language, digest)
+
+
+def post_cards(posts, render):
+    """HTML карточек постов в порядке posts.
+
+    Карточка хранится POST_CARD_TIMEOUT секунд по ключу из id поста,
+    версии 'post:<pk>' и языка; render(post) отрисовывает недостающие.
+    Версии и карточки читаются из кэша одним запросом на страницу.
+    """
+    posts = list(posts)
+    if not settings.POST_CARD_TIMEOUT or not posts:
+        return [render(post) for post in posts]
+    versions = get_versions(*(f'post:{post.pk}' for post in posts))
+    language = get_language()
+    keys = [
+        card_key(post, version, language)
+        for post, version in zip(posts, versions)
+    ]
+    found = cache.get_many(keys)
+    missing = {
+        key: render(post)
+        for post, key in zip(posts, keys) if key not in found
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_TIMEOUT)
+        found.update(missing)
+    return [found[key] for key in keys]
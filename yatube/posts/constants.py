@@ -1,2 +1,4 @@
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
 TITLE_SIZE = 30
+FOLLOWS_PER_PAGE = 30
@@ -0,0 +1,88 @@
+"""Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики меняются F-выражениями из обработчиков сигналов, которые
+выполняются в транзакции сохранения или удаления объекта. Расхождения
+исправляет команда recount_stats.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Follow, Post, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def actual_count(model, field):
+    """Подзапрос, считающий строки model, ссылающиеся на OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(num=Count('pk'))
+            .values('num')
+        ),
+        0,
+    )
+
+
+def recount(user_id):
+    return {
+        name: model.objects.filter(**{field: user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+
+
+def get_stats(user):
+    """Строка статистики пользователя; отсутствующая создается."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        try:
+            with transaction.atomic():
+                return UserStats.objects.create(user=user, **recount(user.pk))
+        except IntegrityError:
+            return UserStats.objects.get(user=user)
+
+
+def shifted(name, delta):
+    """F(name) + delta, но не меньше нуля.
+
+    Счетчики — PositiveIntegerField: если счетчик уже разошелся с данными
+    (загрузка в обход сигналов), уменьшение не должно ломать удаление.
+    """
+    return Greatest(F(name) + delta, 0)
+
+
+def change_stats(user_id, **deltas):
+    """Сдвигает счетчики пользователя.
+
+    Отсутствующая строка не создается: ее посчитает get_stats при чтении.
+    """
+    UserStats.objects.filter(user_id=user_id).update(
+        **{name: shifted(name, delta) for name, delta in deltas.items()}
+    )
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=shifted('comments_count', delta)
+    )
+
+
+def change_follows(user_id, author_id, delta):
+    change_stats(author_id, followers_count=delta)
+    change_stats(user_id, following_count=delta)
+
+
+def change_follows_many(user_id, author_ids, delta):
+    """change_follows для набора авторов двумя запросами."""
+    UserStats.objects.filter(user_id__in=author_ids).update(
+        followers_count=shifted('followers_count', delta)
+    )
+    change_stats(user_id, following_count=delta * len(author_ids))
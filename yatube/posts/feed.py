@@ -0,0 +1,160 @@
+"""Лента подписок, материализованная в таблице FeedEntry.
+
+Пост раскладывается по лентам подписчиков при публикации (fan-out on
+write), поэтому страница ленты читается одним проходом по индексу
+(user, -pub_date). Авторы с числом подписчиков больше
+settings.FEED_FANOUT_LIMIT не раскладываются: их посты подмешиваются
+в ленту при чтении (fan-out on read).
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import batches
+
+
+def celebrity_ids(author_ids):
+    """Авторы из author_ids, посты которых читаются без раскладки."""
+    return set(
+        UserStats.objects.filter(
+            user__in=author_ids,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('user', flat=True)
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    limit = settings.FEED_FANOUT_LIMIT
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(followers) > limit:
+        return
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты автора."""
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id, author_ids):
+    """Добавляет в ленту читателя последние посты каждого из авторов."""
+    entries = []
+    for author_id in set(author_ids) - celebrity_ids(author_ids):
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'id', 'pub_date'
+        )[:settings.FEED_BACKFILL_SIZE]
+        entries += [
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ]
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося читателя."""
+    prune_many(user_id, [author_id])
+
+
+def prune_many(user_id, author_ids):
+    """Убирает посты авторов из ленты отписавшегося читателя.
+
+    Если после отписки автор перестал быть «знаменитостью», его последние
+    посты раскладываются по лентам оставшихся подписчиков после фиксации
+    транзакции (refill).
+    """
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        post__author_id__in=author_ids,
+    ).delete()
+    unfamous = list(
+        Follow.objects.filter(author_id__in=author_ids).values(
+            'author'
+        ).annotate(
+            followers=Count('user')
+        ).filter(
+            followers=settings.FEED_FANOUT_LIMIT
+        ).values_list('author', flat=True)
+    )
+    if unfamous:
+        transaction.on_commit(lambda: refill(unfamous))
+
+
+def refill(author_ids, batch_size=1000):
+    """Раскладывает последние посты авторов по лентам их подписчиков.
+
+    Берется FEED_REFILL_SIZE постов каждого автора, а записи ленты
+    вставляются пачками в отдельных транзакциях, чтобы отписка от
+    автора с тысячей подписчиков не держала базу долго.
+    """
+    authors = set(author_ids) - celebrity_ids(author_ids)
+    entries = _entries(authors, settings.FEED_REFILL_SIZE)
+    for batch in batches(entries, batch_size):
+        with transaction.atomic():
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def rebuild(batch_size=10000):
+    """Раскладывает ленты заново, как backfill для каждой подписки.
+
+    Нужна после загрузки подписок и постов в обход сигналов.
+    """
+    authors = Follow.objects.values('author').annotate(
+        followers=Count('user')
+    ).filter(followers__lte=settings.FEED_FANOUT_LIMIT)
+    entries = _entries(
+        list(authors.values_list('author', flat=True)),
+        settings.FEED_BACKFILL_SIZE,
+    )
+    for batch in batches(entries, batch_size):
+        with transaction.atomic():
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _entries(author_ids, size):
+    for author_id in author_ids:
+        followers = list(
+            Follow.objects.filter(author_id=author_id).values_list(
+                'user_id', flat=True
+            )
+        )
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date'
+        )[:size]
+        for post_id, pub_date in posts:
+            for user_id in followers:
+                yield FeedEntry(
+                    user_id=user_id, post_id=post_id, pub_date=pub_date
+                )
+
+
+def feed_posts(user):
+    """Посты авторов, на которых подписан пользователь, и их порядок.
+
+    Порядок — поля для постраничного вывода по курсору. Без
+    «знаменитостей» лента читается из FeedEntry по индексу
+    (user, -pub_date, -post), поэтому и ключ курсора берется оттуда.
+    """
+    celebrities = celebrity_ids(
+        Follow.objects.filter(user=user).values('author')
+    )
+    if not celebrities:
+        posts = Post.objects.filter(
+            feed_entries__user=user
+        ).order_by('-feed_entries__pub_date')
+        return posts, ('-feed_entries__pub_date', '-feed_entries__post')
+    posts = Post.objects.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=celebrities)
+    )
+    return posts, ('-pub_date', '-pk')
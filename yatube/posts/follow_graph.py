@@ -0,0 +1,144 @@
+"""Граф подписок: на кого подписан пользователь, с множествами в кэше.
+
+following_ids(user_id) — множество id авторов пользователя. Оно хранится
+в кэше FOLLOW_GRAPH_TIMEOUT секунд и удаляется из кэша после фиксации
+транзакции, которая меняет подписки пользователя; при следующем
+обращении множество читается из базы. is_following() отвечает для
+целого списка авторов одним чтением кэша.
+
+follow_many() и unfollow_many() подписывают на набор авторов и отписывают
+от него. Вставка идет без сигналов Follow, а удаление — в блоке
+batched(), в котором обработчики сигналов Follow ничего не делают.
+Счетчики, ленты, версии кэша страниц и граф обновляются здесь же разом
+для всех авторов.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import counters, feed
+from .cache import bump_on_commit
+from .models import Follow, User
+
+KEY = 'follow-graph:following:{}'
+
+_state = threading.local()
+
+
+def following_ids(user_id):
+    """id авторов, на которых подписан пользователь."""
+    key = KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.filter(user_id=user_id).values_list(
+                'author_id', flat=True
+            )
+        )
+        cache.set(key, ids, settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def is_following(user, author_ids):
+    """Словарь {id автора: подписан ли на него user}."""
+    if not user.is_authenticated:
+        return dict.fromkeys(author_ids, False)
+    following = following_ids(user.pk)
+    return {author_id: author_id in following for author_id in author_ids}
+
+
+def invalidate(user_id):
+    """Удаляет множество пользователя из кэша после фиксации.
+
+    Множество не правится на месте: его могли прочитать и закэшировать
+    еще до фиксации, и правка легла бы поверх устаревшего чтения.
+    """
+    transaction.on_commit(lambda: cache.delete(KEY.format(user_id)))
+
+
+@contextmanager
+def batched():
+    """Блок, в котором работу сигналов Follow делает _side_effects."""
+    _state.batched = True
+    try:
+        yield
+    finally:
+        _state.batched = False
+
+
+def in_batch():
+    return getattr(_state, 'batched', False)
+
+
+def _authors(user, author_ids):
+    # Себя и несуществующих пользователей в подписки не берем.
+    return set(
+        User.objects.filter(pk__in=set(author_ids) - {user.pk})
+        .values_list('pk', flat=True)
+    )
+
+
+def _followed(user, author_ids):
+    return set(
+        Follow.objects.filter(user=user, author_id__in=author_ids)
+        .values_list('author_id', flat=True)
+    )
+
+
+def _insert(user, author_ids):
+    """Вставляет подписки и возвращает id авторов действительно новых.
+
+    Подписку, которую успел создать параллельный запрос, отсекает
+    уникальность (user, author): такая вставка откатывается к точке
+    сохранения и не учитывается в счетчиках.
+    """
+    added = set()
+    for author_id in author_ids:
+        try:
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    [Follow(user=user, author_id=author_id)]
+                )
+        except IntegrityError:
+            continue
+        added.add(author_id)
+    return added
+
+
+def _side_effects(user, author_ids, delta):
+    """То, что для одиночной подписки делают сигналы Follow."""
+    if delta > 0:
+        feed.backfill_many(user.pk, author_ids)
+    else:
+        feed.prune_many(user.pk, author_ids)
+    counters.change_follows_many(user.pk, author_ids, delta)
+    bump_on_commit(
+        f'follow:{user.pk}',
+        f'profile:{user.pk}',
+        *(f'profile:{author_id}' for author_id in author_ids),
+    )
+    invalidate(user.pk)
+
+
+def follow_many(user, author_ids):
+    """Подписывает user на авторов и возвращает id новых подписок."""
+    with transaction.atomic():
+        authors = _authors(user, author_ids)
+        added = _insert(user, authors - _followed(user, authors))
+        if added:
+            _side_effects(user, added, 1)
+    return added
+
+
+def unfollow_many(user, author_ids):
+    """Отписывает user от авторов и возвращает id снятых подписок."""
+    with transaction.atomic(), batched():
+        follows = Follow.objects.filter(user=user, author_id__in=author_ids)
+        removed = set(follows.values_list('author_id', flat=True))
+        follows.delete()
+        if removed:
+            _side_effects(user, removed, -1)
+    return removed
@@ -0,0 +1,124 @@
+"""Адаптивные варианты картинок постов для srcset и <picture>.
+
+Для каждой ширины из settings.POST_IMAGE_WIDTHS и каждого формата из
+settings.POST_IMAGE_FORMATS, который умеет сохранять установленный Pillow,
+готовится кадрированная копия картинки. Описание вариантов хранится
+в Post.image_variants, поэтому шаблону не нужны запросы к хранилищу.
+"""
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def available_formats():
+    Image.init()
+    return [
+        name for name in settings.POST_IMAGE_FORMATS
+        if FORMATS[name][0] in Image.SAVE
+    ]
+
+
+def variant_height(width):
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    return round(width * aspect_height / aspect_width)
+
+
+def generate(source):
+    """Готовит варианты картинки source и возвращает их описание."""
+    with default_storage.open(source) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    widths = [w for w in widths if w <= image.width] or widths[:1]
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = []
+    for width in widths:
+        size = (width, variant_height(width))
+        resized = ImageOps.fit(image, size, Image.LANCZOS)
+        for name in available_formats():
+            pil_format, mime = FORMATS[name]
+            buffer = BytesIO()
+            resized.save(
+                buffer, pil_format, quality=settings.POST_IMAGE_QUALITY
+            )
+            path = default_storage.save(
+                f'posts/variants/{stem}-{width}.{name}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants.append({
+                'format': name,
+                'type': mime,
+                'width': width,
+                'height': size[1],
+                'name': path,
+                'size': buffer.tell(),
+            })
+    return variants
+
+
+def dumps(variants):
+    return json.dumps(variants, separators=(',', ':'))
+
+
+def loads(value):
+    # Испорченное описание равносильно отсутствию вариантов:
+    # шаблон покажет обычное превью.
+    try:
+        variants = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return variants if isinstance(variants, list) else []
+
+
+def url(variant):
+    return default_storage.url(variant['name'])
+
+
+def srcset(variants):
+    return ', '.join(f'{url(v)} {v["width"]}w' for v in variants)
+
+
+def picture_sources(variants):
+    """Разметка для <picture> по описанию вариантов.
+
+    Возвращает список (mime, srcset) современных форматов в порядке
+    settings.POST_IMAGE_FORMATS и JPEG-варианты для <img> по возрастанию
+    ширины.
+    """
+    sources = []
+    for name in settings.POST_IMAGE_FORMATS:
+        group = sorted(
+            (v for v in variants if v['format'] == name),
+            key=lambda v: v['width'],
+        )
+        if name == 'jpeg':
+            return sources, group
+        if group:
+            sources.append((group[0]['type'], srcset(group)))
+    return sources, []
+
+
+def choose(variants, width, formats):
+    """Вариант, который выберет браузер для места шириной width пикселей.
+
+    formats — форматы, которые поддерживает браузер.
+    """
+    for name in settings.POST_IMAGE_FORMATS:
+        group = sorted(
+            (v for v in variants if v['format'] == name and name in formats),
+            key=lambda v: v['width'],
+        )
+        if group:
+            return next((v for v in group if v['width'] >= width), group[-1])
+    return None
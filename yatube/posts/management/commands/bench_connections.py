@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import connection_overhead, percentile, sample_urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку запросов с новым соединением с базой '
+        'на каждый запрос и с постоянными соединениями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Сколько запросов делать в каждом режиме',
+        )
+        parser.add_argument(
+            '--max-age',
+            type=int,
+            default=settings.DATABASES['default']['CONN_MAX_AGE'] or 60,
+            help='CONN_MAX_AGE для постоянных соединений',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, requests, max_age, seed, **options):
+        samples = sample_urls(requests, seed)
+        urls = [
+            url
+            for group in zip(samples['index'], samples['post_detail'])
+            for url, _ in group
+        ][:requests]
+        if not urls:
+            raise CommandError('Нет данных: сначала запустите bench_generate')
+        results = {}
+        for label, age in (('без постоянных', 0), ('постоянные', max_age)):
+            latencies, opened = connection_overhead(urls, age)
+            latencies = [latency * 1000 for latency in latencies]
+            results[label] = sum(latencies) / len(latencies)
+            self.stdout.write(
+                f'{label} (CONN_MAX_AGE={age}): в среднем '
+                f'{results[label]:.2f} мс, p50 '
+                f'{percentile(latencies, 50):.2f} мс, '
+                f'соединений открыто {opened}'
+            )
+        self.stdout.write(
+            'Накладные расходы соединения на запрос: {:.2f} мс'.format(
+                results['без постоянных'] - results['постоянные']
+            )
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.bench import generate
+
+
+class Command(BaseCommand):
+    help = 'Наполняет базу воспроизводимым набором данных для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=1000000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Сколько авторов читает каждый пользователь',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько строк записывать одним запросом',
+        )
+
+    def handle(self, *args, users, groups, posts, comments, follows, seed,
+               batch_size, **options):
+        generate(
+            users, groups, posts, comments, follows,
+            seed=seed, batch_size=batch_size, stdout=self.stdout,
+        )
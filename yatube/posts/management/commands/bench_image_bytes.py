@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import image_variants
+from posts.constants import POSTS_PER_PAGE
+from posts.models import Post
+from posts.thumbnails import QueuedThumbnailBackend
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объем картинок на странице ленты: одно превью '
+        'для всех устройств против адаптивных вариантов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=POSTS_PER_PAGE,
+            help='Сколько последних постов с картинками считать страницей',
+        )
+        parser.add_argument(
+            '--viewport',
+            type=int,
+            nargs='+',
+            default=[375, 768, 1280],
+            help='Ширины экрана в CSS-пикселях',
+        )
+        parser.add_argument(
+            '--dpr',
+            type=float,
+            default=2,
+            help='Плотность пикселей экрана',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='+',
+            default=list(settings.POST_IMAGE_FORMATS),
+            help='Форматы, которые поддерживает браузер',
+        )
+
+    def handle(self, *args, posts, viewport, dpr, formats, **options):
+        backend = QueuedThumbnailBackend()
+        geometry, thumbnail_options = settings.POST_THUMBNAILS[0]
+        page = Post.objects.exclude(image='').exclude(
+            image_variants=''
+        ).only('image', 'image_variants')[:posts]
+        thumbnails = []
+        variants = []
+        for post in page:
+            name = backend.thumbnail_name(
+                ImageFile(post.image), geometry, thumbnail_options
+            )
+            if default.storage.exists(name):
+                thumbnails.append(default.storage.size(name))
+                variants.append(post.variants)
+        if not thumbnails:
+            self.stdout.write('Нет постов с готовыми превью и вариантами')
+            return
+        baseline = sum(thumbnails)
+        self.stdout.write(
+            f'Постов: {len(thumbnails)}, превью {geometry}: {baseline} байт'
+        )
+        base_width = settings.POST_IMAGE_ASPECT[0]
+        for width in viewport:
+            slot = min(width, base_width) * dpr
+            total = 0
+            for post_variants in variants:
+                chosen = image_variants.choose(post_variants, slot, formats)
+                total += chosen['size'] if chosen else 0
+            saving = 100 * (baseline - total) / baseline
+            self.stdout.write(
+                f'Экран {width}px x{dpr:g}: {total} байт, '
+                f'экономия {saving:.1f}%'
+            )
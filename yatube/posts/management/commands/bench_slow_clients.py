@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import percentile, sample_urls, slow_clients
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает обслуживание медленных клиентов WSGI-воркерами '
+        'и ASGI-приложением при одном числе потоков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=100,
+            help='Сколько клиентов приходят одновременно',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Сколько потоков выполняют view',
+        )
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.2,
+            help='Сколько секунд клиент читает ответ',
+        )
+        parser.add_argument('--mode', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, clients, workers, delay, mode, seed, **options):
+        samples = sample_urls(clients, seed)
+        # Страницы, которые открывают гости, вперемешку.
+        urls = [
+            url
+            for group in zip(*(
+                samples[name]
+                for name in ('index', 'group_posts', 'profile', 'post_detail')
+            ))
+            for url, _ in group
+        ][:clients]
+        if not urls:
+            raise CommandError('Нет данных: сначала запустите bench_generate')
+        for name in mode:
+            total, latencies = slow_clients(name, urls, workers, delay)
+            latencies = [latency * 1000 for latency in latencies]
+            self.stdout.write(
+                f'{name}: {len(urls)} запросов за {total:.2f} с '
+                f'({len(urls) / total:.1f} в секунду), '
+                f'p50 {percentile(latencies, 50):.0f} мс, '
+                f'p95 {percentile(latencies, 95):.0f} мс'
+            )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import WriteStress
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает базу одновременной записью комментариев и чтением '
+        'страниц и проверяет, что запросы не падают из-за блокировок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=16,
+            help='Сколько пользователей одновременно пишут комментарии',
+        )
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=16,
+            help='Сколько клиентов одновременно читают страницы',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Сколько запросов делает каждый клиент',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, writers, readers, requests, seed, **options):
+        try:
+            stress = WriteStress(writers, readers, requests, seed)
+        except RuntimeError as error:
+            raise CommandError(f'{error}: сначала запустите bench_generate')
+        counts = stress.run()
+        self.stdout.write(
+            'Записей {writes}, не удалось {writes_failed}; '
+            'чтений {reads}, не удалось {reads_failed}'.format(
+                **{
+                    name: counts.get(name, 0)
+                    for name in (
+                        'writes', 'writes_failed', 'reads', 'reads_failed'
+                    )
+                }
+            )
+        )
+        if counts.get('writes_failed') or counts.get('reads_failed'):
+            raise CommandError('Часть запросов не выполнена')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from posts.bench import (CARD_VIEWS, PERCENTILES, percentile, sample_urls,
+                         template_times)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время отрисовки шаблонов лент без кэширующего загрузчика '
+        'и кэша карточек постов и с ними'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=100,
+            help='Сколько запросов делать к каждому виду страниц',
+        )
+        parser.add_argument(
+            '--view',
+            nargs='+',
+            choices=CARD_VIEWS,
+            default=list(CARD_VIEWS),
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, requests, view, seed, **options):
+        urls = sample_urls(requests, seed)
+        for name in view:
+            if not urls[name]:
+                self.stdout.write(f'{name}: нет данных для замера')
+                continue
+            before = template_times(urls[name], cached=False)
+            after = template_times(urls[name], cached=True)
+            self.stdout.write(f'{name}: ' + ', '.join(
+                'p{rank} {before:.2f} → {after:.2f} мс'.format(
+                    rank=rank,
+                    before=percentile(before, rank),
+                    after=percentile(after, rank),
+                )
+                for rank in PERCENTILES
+            ))
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bench import VIEWS, measure, regressions, report, sample_urls
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95/p99) и число запросов к базе '
+        'для страниц постов и сравнивает их с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Сколько запросов делать к каждому виду страниц',
+        )
+        parser.add_argument(
+            '--view',
+            nargs='+',
+            choices=VIEWS,
+            default=list(VIEWS),
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON-файл с базовой линией для сравнения',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Записать результаты в файл --baseline',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Допустимый рост p95 относительно базовой линии',
+        )
+
+    def handle(self, *args, requests, view, seed, cold, baseline,
+               save_baseline, tolerance, **options):
+        if save_baseline and not baseline:
+            raise CommandError('Для --save-baseline нужен --baseline')
+        urls = sample_urls(requests, seed)
+        results = {}
+        for name in view:
+            if not urls[name]:
+                self.stdout.write(f'{name}: нет данных для замера')
+                continue
+            results[name] = report(measure(urls[name], cold=cold))
+            self.stdout.write(
+                '{name}: p50 {p50} мс, p95 {p95} мс, p99 {p99} мс, '
+                'запросов {queries}'.format(name=name, **results[name])
+            )
+        if not baseline:
+            return
+        if save_baseline:
+            with open(baseline, 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(f'Базовая линия записана в {baseline}')
+            return
+        with open(baseline) as file:
+            problems = regressions(results, json.load(file), tolerance)
+        if problems:
+            raise CommandError(
+                'Страницы медленнее базовой линии:\n' + '\n'.join(problems)
+            )
+        self.stdout.write('Регрессий нет')
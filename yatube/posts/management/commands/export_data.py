@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TRANSFERS, export_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии или подписки '
+        'в JSON Lines или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=TRANSFERS)
+        parser.add_argument('path', help='Файл для выгрузки')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько строк читать из базы одним запросом',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <path>.checkpoint',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванную выгрузку с контрольной точки',
+        )
+
+    def handle(self, *args, kind, path, batch_size, checkpoint, resume,
+               **options):
+        rows = export_data(
+            kind, path,
+            data_format=options['format'],
+            batch_size=batch_size,
+            checkpoint=checkpoint,
+            resume=resume,
+            stderr=self.stderr,
+        )
+        self.stdout.write(f'Выгружено строк: {rows}')
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TRANSFERS, import_data
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии или подписки '
+        'из JSON Lines или CSV'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=TRANSFERS)
+        parser.add_argument('path', help='Файл для загрузки')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк записывать одной транзакцией',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <path>.checkpoint',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить прерванную загрузку с контрольной точки',
+        )
+        parser.add_argument(
+            '--skip-derived',
+            action='store_true',
+            help=(
+                'Не пересчитывать счетчики, ленты и поисковый индекс; '
+                'удобно, если следом загружаются другие файлы'
+            ),
+        )
+
+    def handle(self, *args, kind, path, batch_size, checkpoint, resume,
+               skip_derived, **options):
+        rows, skipped = import_data(
+            kind, path,
+            data_format=options['format'],
+            batch_size=batch_size,
+            checkpoint=checkpoint,
+            resume=resume,
+            derived=not skip_derived,
+            stdout=self.stdout,
+            stderr=self.stderr,
+        )
+        self.stdout.write(f'Загружено строк: {rows}, пропущено: {skipped}')
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import ThumbnailJob
+from posts.thumbnails import claimable, process_job
+
+
+class Command(BaseCommand):
+    help = 'Готовит превью для картинок из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться, а ждать новые задачи',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза между проверками очереди в режиме --loop, сек.',
+        )
+
+    def handle(self, *args, loop, interval, **options):
+        while True:
+            pending = ThumbnailJob.objects.filter(
+                claimable()
+            ).values_list('pk', flat=True)
+            done = 0
+            for job_id in pending:
+                process_job(job_id)
+                done += 1
+            if done:
+                self.stdout.write(f'Обработано задач: {done}')
+            if not loop:
+                return
+            time.sleep(interval)
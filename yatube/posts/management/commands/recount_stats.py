@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max
+
+from posts.counters import USER_COUNTERS, actual_count
+from posts.models import Comment, Post, User, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько строк обновлять одним запросом',
+        )
+        parser.add_argument(
+            '--counter',
+            action='append',
+            choices=(*USER_COUNTERS, 'comments_count'),
+            help='Пересчитать только этот счетчик; можно повторять',
+        )
+
+    def handle(self, *args, batch_size, counter, **options):
+        counters = counter or (*USER_COUNTERS, 'comments_count')
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True
+        )
+        # Размер пачки вставки выбирает бэкенд: у SQLite есть предел
+        # числа строк в одном INSERT.
+        created = UserStats.objects.bulk_create(
+            (UserStats(user_id=pk) for pk in missing.iterator()),
+            ignore_conflicts=True,
+        )
+        self.stdout.write(f'Создано строк статистики: {len(created)}')
+        for name, (model, field) in USER_COUNTERS.items():
+            if name in counters:
+                self.repair(
+                    UserStats.objects.all(),
+                    name,
+                    actual_count(model, field),
+                    batch_size,
+                )
+        if 'comments_count' in counters:
+            self.repair(
+                Post.objects.all(),
+                'comments_count',
+                actual_count(Comment, 'post'),
+                batch_size,
+            )
+
+    def repair(self, queryset, name, actual, batch_size):
+        drifted = queryset.annotate(actual=actual).exclude(
+            **{name: F('actual')}
+        )
+        fixed = 0
+        last_pk = queryset.aggregate(last=Max('pk'))['last'] or 0
+        for start in range(0, last_pk + 1, batch_size):
+            batch = drifted.filter(pk__gte=start, pk__lt=start + batch_size)
+            pks = list(batch.values_list('pk', flat=True))
+            if pks:
+                fixed += queryset.filter(pk__in=pks).update(**{name: actual})
+        label = f'{queryset.model._meta.verbose_name_plural}.{name}'
+        self.stdout.write(f'{label}: исправлено {fixed}')
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Post
+from posts.utils import render_text
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет готовый HTML текста постов и комментариев, '
+        'записанных в обход save()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк обновлять одним запросом',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='rerender',
+            help='Перерисовать и уже заполненные строки',
+        )
+
+    def handle(self, *args, batch_size, rerender, **options):
+        for model in (Post, Comment):
+            queryset = model.objects.exclude(text='')
+            if not rerender:
+                queryset = queryset.filter(text_html='')
+            queryset = queryset.order_by('pk').only('text')
+            rendered = 0
+            last_pk = 0
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                for obj in batch:
+                    obj.text_html = render_text(obj.text)
+                model.objects.bulk_update(batch, ['text_html'])
+                rendered += len(batch)
+                last_pk = batch[-1].pk
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: заполнено {rendered}'
+            )
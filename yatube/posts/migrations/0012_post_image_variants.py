@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:04
+
+from django.db import migrations, models
+
+
+def requeue_images(apps, schema_editor):
+    # Варианты готовятся вместе с превью: картинки уже опубликованных
+    # постов снова ставятся в очередь для команды process_thumbnails.
+    Post = apps.get_model('posts', 'Post')
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    sources = set(
+        Post.objects.exclude(image='').values_list('image', flat=True)
+    )
+    ThumbnailJob.objects.filter(source__in=sources).update(
+        status='pending', attempts=0, error=''
+    )
+    known = set(ThumbnailJob.objects.values_list('source', flat=True))
+    ThumbnailJob.objects.bulk_create(
+        ThumbnailJob(source=source) for source in sources - known
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_thumbnailjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False, help_text='Описание адаптивных вариантов картинки в JSON', verbose_name='Варианты картинки'),
+        ),
+        migrations.RunPython(requeue_images, migrations.RunPython.noop),
+    ]
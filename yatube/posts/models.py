@@ -1,9 +1,41 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.utils.safestring import mark_safe
+
+from . import image_variants
+from .utils import render_text
 
 User = get_user_model()
 
 
+class AtomicSaveMixin:
+    """Сохраняет объект и обработчики post_save в одной транзакции."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class RenderedTextMixin:
+    """Хранит в text_html готовый HTML поля text.
+
+    HTML считается при сохранении, а шаблоны выводят его как есть,
+    не прогоняя linebreaks при каждой отрисовке.
+    """
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None or 'text' in update_fields:
+            self.text_html = render_text(self.text)
+            if update_fields is not None:
+                update_fields = {*update_fields, 'text_html'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @property
+    def html(self):
+        # Строки, записанные в обход save(), заполняет render_text_html.
+        return mark_safe(self.text_html or render_text(self.text))
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, db_index=True, verbose_name='User')
@@ -13,11 +45,35 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек лент: все нужное шаблону одним запросом."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'text_html',
+            'pub_date',
+            'image',
+            'image_variants',
+            'author',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'comments_count',
+            'group',
+            'group__slug',
+        )
+
+
+class Post(RenderedTextMixin, AtomicSaveMixin, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста'
     )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         db_index=True,
@@ -43,17 +99,44 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        editable=False,
+        help_text='Описание адаптивных вариантов картинки в JSON',
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_id_idx',
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text
 
+    @property
+    def variants(self):
+        return image_variants.loads(self.image_variants)
+
 
-class Comment(models.Model):
+class Comment(RenderedTextMixin, AtomicSaveMixin, models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -70,6 +153,11 @@ class Comment(models.Model):
         verbose_name='Ваш комментарий',
         help_text='Ваше мнение - как дырка... Короче, показывай дырку!',
     )
+    text_html = models.TextField(
+        'HTML текста',
+        blank=True,
+        editable=False,
+    )
     created = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата комментария',
@@ -80,11 +168,17 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_id_idx',
+            ),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -100,5 +194,125 @@ class Follow(models.Model):
         help_text='Тот, на кого подписались',
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
     def __str__(self):
         return self.title
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        unique_together = ('user', 'post')
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_post_idx',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'{self.user} <- {self.post_id}'
+
+
+class ThumbnailJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    source = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Исходная картинка',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создано',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлено',
+    )
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Задача превью'
+        verbose_name_plural = 'Задачи превью'
+
+    def __str__(self):
+        return f'{self.source} ({self.status})'
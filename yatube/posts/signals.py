@@ -0,0 +1,136 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import cache, counters, feed, follow_graph, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    if follow_graph.in_batch():
+        return
+    feed.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_follows(instance.user_id, instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    if follow_graph.in_batch():
+        return
+    counters.change_follows(instance.user_id, instance.author_id, -1)
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_loaded_state(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = str(instance.__dict__.get('image') or '')
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, created, **kwargs):
+    image = instance.image.name if instance.image else ''
+    if image == instance._loaded_image:
+        return
+    if not created:
+        # Варианты прежней картинки больше не подходят.
+        Post.objects.filter(pk=instance.pk).update(image_variants='')
+        instance.image_variants = ''
+    if image:
+        thumbnails.enqueue(image, restart=True)
+    instance._loaded_image = image
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    cache.bump_on_commit(
+        *cache.post_namespaces(
+            instance.pk, instance.author_id, instance.group_id
+        ),
+        f'group:{instance._loaded_group_id}'
+        if instance._loaded_group_id else None,
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'author_id', 'group_id'
+    ).first()
+    if post is None:
+        return
+    cache.bump_on_commit(*cache.post_namespaces(
+        instance.post_id, post['author_id'], post['group_id']
+    ))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow(sender, instance, **kwargs):
+    if follow_graph.in_batch():
+        return
+    cache.bump_on_commit(
+        f'follow:{instance.user_id}',
+        f'profile:{instance.user_id}',
+        f'profile:{instance.author_id}',
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_graph(sender, instance, **kwargs):
+    if follow_graph.in_batch():
+        return
+    follow_graph.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group(sender, instance, **kwargs):
+    cache.bump_on_commit('index', f'group:{instance.pk}')
@@ -0,0 +1,24 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """HTML карточек постов ленты: готовые берутся из кэша карточек.
+
+    {% post_cards page_obj as cards %}
+    """
+    card = context.template.engine.get_template(
+        'posts/includes/post_card.html'
+    )
+
+    def render(post):
+        return card.render(template.Context(
+            {'post': post}, autoescape=context.autoescape
+        ))
+
+    return [mark_safe(html) for html in cache.post_cards(posts or (), render)]
@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from posts import image_variants
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """Картинка поста: <picture> с srcset по готовым вариантам.
+
+    Пока варианты не готовы, показывается обычное превью (или заглушка).
+    """
+    if not post.image:
+        return {}
+    sources, jpeg = image_variants.picture_sources(post.variants)
+    if not jpeg:
+        geometry, options = settings.POST_THUMBNAILS[0]
+        return {'src': get_thumbnail(post.image, geometry, **options).url}
+    base_width = settings.POST_IMAGE_ASPECT[0]
+    fallback = min(jpeg, key=lambda v: abs(v['width'] - base_width))
+    return {
+        'sources': sources,
+        'src': image_variants.url(fallback),
+        'srcset': image_variants.srcset(jpeg),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'width': fallback['width'],
+        'height': fallback['height'],
+    }
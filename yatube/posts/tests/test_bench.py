@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from posts import bench
+from posts.models import (Comment, FeedEntry, Follow, Group, Post, User,
+                          UserStats)
+
+
+class BenchTests(TestCase):
+    def generate(self, seed=0):
+        bench.generate(
+            users=6, groups=2, posts=30, comments=20, follows=2,
+            seed=seed, batch_size=7,
+        )
+
+    def test_generate_is_deterministic(self):
+        """Генератор с одним seed создает одинаковые данные"""
+        self.generate()
+        first = list(Post.objects.values_list('text', 'author__username'))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.generate()
+        second = list(Post.objects.values_list('text', 'author__username'))
+        self.assertEqual(len(first), 30)
+        self.assertEqual(
+            [text for text, _ in first], [text for text, _ in second]
+        )
+
+    def test_generate_fills_derived_data(self):
+        """Генератор строит счетчики и ленты подписок"""
+        self.generate()
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertTrue(Follow.objects.exists())
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 30
+        )
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=follow.user, post__author=follow.author
+            ).exists()
+        )
+
+    def test_percentile(self):
+        """Перцентиль считается по ближайшему рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(bench.percentile(values, 50), 50)
+        self.assertEqual(bench.percentile(values, 95), 95)
+        self.assertEqual(bench.percentile([7], 99), 7)
+
+    def test_bench_views_baseline(self):
+        """Замеры сохраняются как базовая линия и сравниваются с ней"""
+        self.generate()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'baseline.json')
+        out = StringIO()
+        call_command(
+            'bench_views', requests=3, baseline=path, save_baseline=True,
+            stdout=out,
+        )
+        for view in bench.VIEWS:
+            self.assertIn(f'{view}: p50', out.getvalue())
+        with open(path) as file:
+            baseline = json.load(file)
+        self.assertEqual(set(baseline), set(bench.VIEWS))
+        for summary in baseline.values():
+            summary['queries'] = 0
+        with open(path, 'w') as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, 'запросов'):
+            call_command(
+                'bench_views', requests=3, baseline=path, stdout=StringIO()
+            )
@@ -0,0 +1,83 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.constants import COMMENTS_PER_PAGE
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.total = COMMENTS_PER_PAGE * 2 + 5
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Коммент {n}')
+            for n in range(cls.total)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def fragment_url(self, response):
+        match = re.search(
+            r'data-fragment="([^"]+)"', response.content.decode()
+        )
+        return match and match.group(1).replace('&amp;', '&')
+
+    def test_first_render_is_capped(self):
+        """Страница поста показывает только первую страницу комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, f'Коммент {self.total - 1}')
+        self.assertTrue(comments.has_next())
+        self.assertIsNotNone(self.fragment_url(response))
+
+    def test_load_more_walks_all_comments(self):
+        """Фрагменты «Показать еще» выдают каждый комментарий один раз"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        texts = [comment.text for comment in response.context['comments']]
+        url = self.fragment_url(response)
+        while url:
+            response = self.client.get(url)
+            self.assertNotContains(response, '<html')
+            texts += [comment.text for comment in response.context['comments']]
+            url = self.fragment_url(response)
+        self.assertEqual(
+            texts, [f'Коммент {n}' for n in reversed(range(self.total))]
+        )
+
+    def test_fragment_queries_do_not_grow(self):
+        """Фрагмент стоит одинаковое число запросов на любой странице"""
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        counts = []
+        while url:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            counts.append(len(queries))
+            url = self.fragment_url(response)
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_cached_fragment_skips_comment_query(self):
+        """При попадании в кэш комментарии из базы не читаются"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(
+            any('posts_comment' in query['sql'] for query in queries)
+        )
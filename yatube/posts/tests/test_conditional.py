@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from posts import follow_graph
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+class ConditionalGetTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+
+    def test_not_modified_without_rendering(self):
+        """Неизменившаяся страница отдается ответом 304 без шаблона"""
+        for user in (None, self.reader):
+            if user is not None:
+                self.client.force_login(user)
+            for url in self.urls():
+                with self.subTest(user=user, url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                    self.assertEqual(response.status_code, 304)
+                    self.assertIsNone(response.context)
+
+    def test_if_modified_since(self):
+        """Заголовок If-Modified-Since тоже дает ответ 304"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        tag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_changes_follower_profile(self):
+        """Подписка и отписка меняют ETag профиля самого подписчика"""
+        self.client.force_login(self.reader)
+        url = reverse('posts:profile', args=(self.reader.username,))
+        tag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'подписок: 1')
+        tag = response['ETag']
+        follow_graph.unfollow_many(self.reader, [self.author.pk])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'подписок: 0')
+
+    def test_etag_differs_between_users(self):
+        """ETag гостя не подходит авторизованному пользователю"""
+        url = reverse('posts:index')
+        tag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_object(self):
+        """Для отсутствующего объекта ответ 404, а не 304"""
+        url = reverse('posts:post_detail', args=(0,))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counter(self):
+        """Создание и удаление поста меняет счетчик постов автора"""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_comment_counter(self):
+        """Комментарии считаются в поле поста"""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Коммент'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка меняет счетчики подписчиков и подписок"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_delete_with_zero_counter(self):
+        """Удаление не падает, если счетчик уже разошелся до нуля"""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.reader, text='Коммент')]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        UserStats.objects.update(posts_count=0)
+        Comment.objects.get().delete()
+        Follow.objects.get().delete()
+        post.delete()
+        stats = self.stats(self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (0, 0)
+        )
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет разошедшиеся счетчики"""
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Коммент')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(posts_count=42, followers_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comments_count=0)
+        call_command('recount_stats', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author_stats = self.stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def get_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        self.client.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(self.get_feed(), [self.old_post])
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков и только в них"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        Post.objects.create(text='Чужой пост', author=self.stranger)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.get_feed(), [post, self.old_post])
+
+    def test_unfollow_prunes_feed(self):
+        """Отписка убирает посты автора из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.get_feed(), [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1, FEED_REFILL_SIZE=1)
+    def test_refill_after_commit(self):
+        """Бывшая «знаменитость» раскладывается после фиксации отписки"""
+        post = Post.objects.create(text='Свежий пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        # Посты, вышедшие, пока автор был «знаменитостью», не разложены.
+        FeedEntry.objects.all().delete()
+        callbacks = []
+        with mock.patch(
+            'posts.feed.transaction.on_commit', callbacks.append
+        ):
+            Follow.objects.get(user=self.stranger).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            list(
+                FeedEntry.objects.filter(user=self.reader)
+                .values_list('post', flat=True)
+            ),
+            [post.pk],
+        )
@@ -0,0 +1,164 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from posts import follow_graph
+from posts.models import FeedEntry, Follow, Post, UserStats
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+class FollowGraphTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{n}') for n in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, users):
+        return [user.pk for user in users]
+
+    def test_sets_are_cached(self):
+        """Множество подписок читается из базы один раз"""
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follow_graph.following_ids(self.reader.pk),
+                {self.authors[0].pk},
+            )
+            follow_graph.following_ids(self.reader.pk)
+
+    def test_batch_lookup(self):
+        """is_following отвечает для списка авторов без запросов к базе"""
+        follow_graph.following_ids(self.reader.pk)
+        with self.assertNumQueries(0):
+            state = follow_graph.is_following(
+                self.reader, self.ids(self.authors)
+            )
+        self.assertEqual(
+            state,
+            {
+                self.authors[0].pk: True,
+                self.authors[1].pk: False,
+                self.authors[2].pk: False,
+            },
+        )
+        self.assertEqual(
+            follow_graph.is_following(AnonymousUser(), [self.authors[0].pk]),
+            {self.authors[0].pk: False},
+        )
+
+    def test_single_follow_resets_cached_set(self):
+        """Подписка и отписка сбрасывают множество в кэше"""
+        follow_graph.following_ids(self.reader.pk)
+        follow = Follow.objects.create(
+            user=self.reader, author=self.authors[1]
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follow_graph.following_ids(self.reader.pk),
+                set(self.ids(self.authors[:2])),
+            )
+        follow.delete()
+        self.assertEqual(
+            follow_graph.following_ids(self.reader.pk), {self.authors[0].pk}
+        )
+
+    def test_follow_many(self):
+        """Массовая подписка пропускает себя, повторы и несуществующих"""
+        follow_graph.following_ids(self.reader.pk)
+        added = follow_graph.follow_many(
+            self.reader, self.ids(self.authors) + [self.reader.pk, 0]
+        )
+        self.assertEqual(added, set(self.ids(self.authors[1:])))
+        self.assertEqual(
+            follow_graph.following_ids(self.reader.pk),
+            set(self.ids(self.authors)),
+        )
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 3
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[1]).followers_count, 1
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_follow_many_counts_inserted_rows(self):
+        """Подписка, созданная параллельно, не считается второй раз"""
+        # Чтение существующих подписок не видит подписку на authors[0],
+        # как если бы ее создал параллельный запрос.
+        with mock.patch.object(follow_graph, '_followed', return_value=set()):
+            added = follow_graph.follow_many(
+                self.reader, self.ids(self.authors[:2])
+            )
+        self.assertEqual(added, {self.authors[1].pk})
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 2
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[0]).followers_count, 1
+        )
+
+    def test_unfollow_many(self):
+        """Массовая отписка чистит ленту, счетчики и множества"""
+        follow_graph.follow_many(self.reader, self.ids(self.authors))
+        removed = follow_graph.unfollow_many(
+            self.reader, self.ids(self.authors[:2])
+        )
+        self.assertEqual(removed, set(self.ids(self.authors[:2])))
+        self.assertEqual(
+            follow_graph.following_ids(self.reader.pk), {self.authors[2].pk}
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.authors[0]).followers_count, 0
+        )
+        self.assertEqual(
+            list(
+                FeedEntry.objects.filter(user=self.reader)
+                .values_list('post__author', flat=True)
+            ),
+            [self.authors[2].pk],
+        )
+        self.assertEqual(
+            follow_graph.unfollow_many(self.reader, [self.authors[0].pk]),
+            set(),
+        )
+
+    def test_follow_list_pages(self):
+        """Страницы подписчиков и подписок показывают кнопки читателю"""
+        Follow.objects.create(user=self.authors[1], author=self.reader)
+        self.client.force_login(self.authors[0])
+        response = self.client.get(
+            reverse('posts:following', args=(self.reader.username,))
+        )
+        self.assertEqual(
+            response.context['people'], [(self.authors[0], False)]
+        )
+        response = self.client.get(
+            reverse('posts:followers', args=(self.reader.username,))
+        )
+        self.assertEqual(
+            response.context['people'], [(self.authors[1], False)]
+        )
+        self.assertContains(
+            response,
+            reverse('posts:profile_follow', args=(self.authors[1].username,)),
+        )
@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from posts import image_variants
+from posts.models import Post, ThumbnailJob
+from posts.tests.test_thumbnails import make_image
+from posts.thumbnails import process_job
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ImageVariantsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image()
+        )
+
+    def process(self):
+        process_job(ThumbnailJob.objects.get(source=self.post.image.name).pk)
+        self.post.refresh_from_db()
+
+    def render(self, post):
+        return Template(
+            '{% load post_images %}{% post_picture post %}'
+        ).render(Context({'post': post}))
+
+    def test_job_stores_variants(self):
+        """Очередь превью готовит варианты всех ширин и форматов"""
+        self.process()
+        variants = self.post.variants
+        formats = image_variants.available_formats()
+        self.assertIn('jpeg', formats)
+        # Картинка шириной 1200: ширина 1440 пропускается.
+        self.assertEqual(
+            {(v['format'], v['width']) for v in variants},
+            {(f, w) for f in formats for w in (480, 960)},
+        )
+        for variant in variants:
+            self.assertEqual(
+                variant['height'], image_variants.variant_height(
+                    variant['width']
+                )
+            )
+            self.assertTrue(variant['size'] > 0)
+
+    def test_tag_renders_picture(self):
+        """Тег post_picture выводит <picture> с srcset"""
+        self.assertNotIn('<picture>', self.render(self.post))
+        self.process()
+        html = self.render(self.post)
+        self.assertIn('<picture>', html)
+        self.assertIn('480w', html)
+        self.assertIn('960w', html)
+        self.assertIn(f'sizes="{settings.POST_IMAGE_SIZES}"', html)
+
+    def test_tag_without_image(self):
+        """Пост без картинки не выводит ничего"""
+        post = Post.objects.create(text='Без картинки', author=self.user)
+        self.assertEqual(self.render(post).strip(), '')
+
+    def test_new_image_resets_variants(self):
+        """Смена картинки сбрасывает варианты прежней"""
+        self.process()
+        self.post.image = make_image('other.jpg')
+        self.post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.variants, [])
+
+    def test_choose_prefers_modern_format(self):
+        """Браузер берет первый поддерживаемый формат и подходящую ширину"""
+        variants = [
+            {'format': f, 'width': w, 'size': 1}
+            for f in ('webp', 'jpeg') for w in (480, 960)
+        ]
+        chosen = image_variants.choose(variants, 700, ('webp', 'jpeg'))
+        self.assertEqual((chosen['format'], chosen['width']), ('webp', 960))
+        chosen = image_variants.choose(variants, 2000, ('jpeg',))
+        self.assertEqual((chosen['format'], chosen['width']), ('jpeg', 960))
+
+    def test_bench_image_bytes(self):
+        """Команда сравнивает объем превью и вариантов"""
+        self.process()
+        out = StringIO()
+        call_command('bench_image_bytes', viewport=[375], stdout=out)
+        self.assertIn('Постов: 1', out.getvalue())
+        self.assertIn('Экран 375px', out.getvalue())
+
+    def test_broken_metadata_falls_back_to_thumbnail(self):
+        """Испорченное описание вариантов не ломает страницу"""
+        self.post.image_variants = 'не json'
+        self.assertEqual(self.post.variants, [])
+        self.assertNotIn('<picture>', self.render(self.post))
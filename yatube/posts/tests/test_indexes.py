@@ -0,0 +1,94 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.constants import POSTS_PER_PAGE
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Какая-то тестовая группа'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Коммент'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def query_plans(self, url, table):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if f'FROM "{table}"' not in sql or 'ORDER BY' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans.append(' / '.join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def test_hot_queries_use_indexes_without_sorting(self):
+        """Запросы лент читают индекс и не сортируют выборку"""
+        self.check_pages()
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_use_indexes_without_sorting(self):
+        """В режиме курсора ленты тоже читаются по индексу без сортировки"""
+        self.check_pages()
+        # Вторая страница ленты подписок: условие по ключу курсора.
+        for number in range(POSTS_PER_PAGE):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        url = reverse('posts:follow_index')
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual(len(page), POSTS_PER_PAGE)
+        plans = self.query_plans(
+            f'{url}?cursor={page.next_cursor}', 'posts_post'
+        )
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn('INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def check_pages(self):
+        pages = {
+            reverse('posts:index'): 'posts_post',
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ): 'posts_post',
+            reverse(
+                'posts:profile', kwargs={'username': 'author'}
+            ): 'posts_post',
+            reverse('posts:follow_index'): 'posts_post',
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ): 'posts_comment',
+        }
+        for url, table in pages.items():
+            with self.subTest(url=url):
+                plans = self.query_plans(url, table)
+                self.assertTrue(plans)
+                for plan in plans:
+                    self.assertIn('INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
@@ -1,11 +1,14 @@
 import shutil
 import tempfile
 
+from io import StringIO
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Group, Post
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
@@ -63,3 +66,41 @@ class PostModelTest(TestCase):
             with self.subTest(ht=ht):
                 response = self.post._meta.get_field(ht).help_text
                 self.assertEqual(response, text)
+
+
+class RenderedTextTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_html_is_rendered_on_save(self):
+        """HTML текста считается при сохранении и при правке"""
+        post = Post.objects.create(author=self.user, text='<b>Раз</b>\nдва')
+        self.assertEqual(
+            post.text_html, '<p>&lt;b&gt;Раз&lt;/b&gt;<br>два</p>'
+        )
+        post.text = 'Три\n\nчетыре'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>Три</p>\n\n<p>четыре</p>')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Коммент'
+        )
+        self.assertEqual(comment.text_html, '<p>Коммент</p>')
+
+    def test_backfill_command(self):
+        """render_text_html заполняет строки, записанные в обход save()"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.bulk_create([Post(author=self.user, text='Без HTML')])
+        Post.objects.filter(pk=post.pk).update(text_html='<p>Свой</p>')
+        missing = Post.objects.get(text='Без HTML')
+        self.assertEqual(missing.text_html, '')
+        self.assertEqual(missing.html, '<p>Без HTML</p>')
+        call_command('render_text_html', stdout=StringIO())
+        missing.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(missing.text_html, '<p>Без HTML</p>')
+        self.assertEqual(post.text_html, '<p>Свой</p>')
+        call_command('render_text_html', rerender=True, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, '<p>Пост</p>')
@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import translation
+from posts import cache as post_cache
+from posts.models import Group, Post
+from posts.tests.utils import OnCommitMixin
+
+User = get_user_model()
+
+
+@override_settings(VIEW_CACHE_POLICIES={})
+class PostCardTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Старый текст'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_card_on_every_feed(self):
+        """Карточка поста одинакова на всех страницах лент"""
+        cards = [
+            self.client.get(url).content.decode()
+            for url in (
+                reverse('posts:index'),
+                reverse('posts:group_list', args=(self.group.slug,)),
+                reverse('posts:profile', args=(self.author.username,)),
+            )
+        ]
+        for content in cards:
+            for url in (
+                reverse('posts:post_detail', args=(self.post.pk,)),
+                reverse('posts:profile', args=(self.author.username,)),
+                reverse('posts:group_list', args=(self.group.slug,)),
+            ):
+                with self.subTest(url=url):
+                    self.assertIn(f'href="{url}"', content)
+
+    def test_card_is_cached_until_post_changes(self):
+        """Карточка берется из кэша, пока не сдвинута версия поста"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        self.assertContains(self.client.get(url), 'Старый текст')
+        self.post.refresh_from_db()
+        self.post.save()
+        self.assertContains(self.client.get(url), 'Новый текст')
+
+    def test_cards_are_rendered_once_per_language(self):
+        """Недостающие карточки отрисовываются, готовые — нет"""
+        posts = Post.objects.for_feed()
+        render = mock.Mock(return_value='card')
+        self.assertEqual(post_cache.post_cards(posts, render), ['card'])
+        post_cache.post_cards(posts, render)
+        self.assertEqual(render.call_count, 1)
+        with translation.override('en'):
+            post_cache.post_cards(posts, render)
+        self.assertEqual(render.call_count, 2)
+
+    @override_settings(POST_CARD_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        """При POST_CARD_TIMEOUT=0 карточки отрисовываются каждый раз"""
+        posts = Post.objects.for_feed()
+        render = mock.Mock(return_value='card')
+        post_cache.post_cards(posts, render)
+        post_cache.post_cards(posts, render)
+        self.assertEqual(render.call_count, 2)
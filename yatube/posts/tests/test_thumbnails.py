@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from posts.models import Post, ThumbnailJob
+from posts.thumbnails import enqueue, process_job
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def make_image(name='photo.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_shows_placeholder_until_job_is_done(self):
+        """Пока превью не готово, страница отдает заглушку"""
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user, image=make_image()
+        )
+        job = ThumbnailJob.objects.get(source=post.image.name)
+        self.assertEqual(job.status, ThumbnailJob.PENDING)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'data:image/svg+xml')
+        process_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.DONE)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'data:image/svg+xml')
+        self.assertContains(response, settings.MEDIA_URL + 'posts/variants/')
+
+    def test_missing_source_fails_after_attempts(self):
+        """Задача с битой картинкой после всех попыток помечается ошибкой"""
+        job = ThumbnailJob.objects.create(source='posts/missing.jpg')
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            for _ in range(settings.THUMBNAIL_MAX_ATTEMPTS):
+                process_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ThumbnailJob.FAILED)
+        self.assertEqual(job.attempts, settings.THUMBNAIL_MAX_ATTEMPTS)
+
+    def test_waiting_job_is_only_read(self):
+        """Страница с превью из очереди не пишет в базу"""
+        ThumbnailJob.objects.create(source='posts/photo.jpg')
+        with self.assertNumQueries(1):
+            enqueue('posts/photo.jpg')
+
+    def test_done_job_restarts_when_thumbnail_is_lost(self):
+        """Готовая задача ставится заново, если превью нет в kvstore"""
+        job = ThumbnailJob.objects.create(
+            source='posts/photo.jpg', status=ThumbnailJob.DONE, attempts=1
+        )
+        enqueue(job.source)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.attempts), (ThumbnailJob.PENDING, 0)
+        )
+
+    def test_abandoned_job_is_reclaimed(self):
+        """Задача, зависшая в RUNNING, берется заново"""
+        job = ThumbnailJob.objects.create(
+            source='posts/missing.jpg', status=ThumbnailJob.RUNNING
+        )
+        process_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 0)
+        ThumbnailJob.objects.filter(pk=job.pk).update(
+            updated=timezone.now() - timedelta(
+                seconds=settings.THUMBNAIL_RUNNING_TIMEOUT + 1
+            )
+        )
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            process_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.attempts), (ThumbnailJob.PENDING, 1)
+        )
@@ -0,0 +1,186 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from posts import transfer
+from posts.models import (Comment, FeedEntry, Follow, Group, Post, User,
+                          UserStats)
+from search.engines import get_engine
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.pub_date = timezone.now() - timedelta(days=3)
+        self.posts = [
+            Post.objects.create(
+                author=self.author,
+                group=self.group if i % 2 else None,
+                text=f'Пост {i}\nс переносом, "кавычками" и запятой',
+            )
+            for i in range(5)
+        ]
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date=self.pub_date
+        )
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def export_all(self, extension):
+        paths = {}
+        for kind in transfer.TRANSFERS:
+            paths[kind] = self.path(f'{kind}.{extension}')
+            call_command(
+                'export_data', kind, paths[kind], batch_size=2,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+        return paths
+
+    def import_all(self, paths):
+        for kind in ('groups', 'posts', 'comments', 'follows'):
+            if kind not in paths:
+                continue
+            call_command(
+                'import_data', kind, paths[kind], batch_size=2,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+
+    def snapshot(self):
+        return {
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug'
+            )),
+            'comments': list(Comment.objects.values_list(
+                'pk', 'post_id', 'author__username', 'text'
+            )),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            'groups': list(Group.objects.values_list('slug', 'title')),
+        }
+
+    def test_round_trip(self):
+        """Выгруженные данные загружаются обратно без потерь"""
+        for extension in ('jsonl', 'csv'):
+            with self.subTest(extension=extension):
+                before = self.snapshot()
+                paths = self.export_all(extension)
+                Group.objects.all().delete()
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                self.import_all(paths)
+                self.assertEqual(self.snapshot(), before)
+                for path in paths.values():
+                    self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_import_rebuilds_derived_data(self):
+        """После загрузки пересчитываются счетчики и ленты подписок"""
+        paths = self.export_all('jsonl')
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        self.import_all(paths)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 5
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 5
+        )
+
+    def test_import_rebuilds_only_affected_data(self):
+        """Загрузка пересчитывает только то, что затрагивает ее вид"""
+        paths = self.export_all('jsonl')
+        with mock.patch('posts.transfer.feed.rebuild') as rebuild, \
+                mock.patch('posts.transfer.call_command') as command:
+            self.import_all({'groups': paths['groups']})
+            rebuild.assert_not_called()
+            command.assert_not_called()
+            self.import_all({'comments': paths['comments']})
+            rebuild.assert_not_called()
+            self.assertEqual(
+                command.call_args[1]['counter'], ['comments_count']
+            )
+
+    def test_import_indexes_loaded_posts(self):
+        """Загруженные посты сразу попадают в поисковый индекс"""
+        paths = self.export_all('jsonl')
+        Post.objects.all().delete()
+        get_engine().clear()
+        self.import_all({'posts': paths['posts']})
+        self.assertEqual(len(get_engine().search('кавычк', 0, 10)), 5)
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка того же файла не создает дубликатов"""
+        paths = self.export_all('jsonl')
+        self.import_all(paths)
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_missing_references_are_skipped(self):
+        """Записи со ссылками на неизвестных авторов пропускаются"""
+        path = self.path('posts.jsonl')
+        with open(path, 'w') as file:
+            for author in ('author', 'nobody'):
+                file.write(json.dumps({'text': 'Новый', 'author': author}))
+                file.write('\n')
+        loaded, skipped = transfer.import_data('posts', path, derived=False)
+        self.assertEqual((loaded, skipped), (1, 1))
+        post = Post.objects.get(text='Новый')
+        self.assertIsNone(post.group)
+        self.assertIsNotNone(post.pub_date)
+        self.assertEqual(post.image, '')
+
+    def test_resume_from_checkpoint(self):
+        """Прерванная загрузка продолжается с контрольной точки"""
+        path = self.export_all('csv')['posts']
+        Post.objects.all().delete()
+        with open(path, 'rb') as file:
+            records = list(transfer.read_records(file, 'csv', 0))
+        # Будто первые две записи уже загружены, а потом процесс упал.
+        transfer.Checkpoint(f'{path}.checkpoint').save(
+            offset=records[1][1], rows=2
+        )
+        loaded, _ = transfer.import_data(
+            'posts', path, resume=True, derived=False
+        )
+        self.assertEqual(loaded, 5)
+        self.assertEqual(
+            set(Post.objects.values_list('pk', flat=True)),
+            {post.pk for post in self.posts[2:]},
+        )
+
+    def test_export_resume_truncates_partial_tail(self):
+        """Продолжение выгрузки отбрасывает недописанный хвост файла"""
+        path = self.path('posts.jsonl')
+        transfer.export_data('posts', path)
+        with open(path, 'rb') as file:
+            complete = file.read()
+        first = complete.split(b'\n')[0] + b'\n'
+        with open(path, 'wb') as file:
+            file.write(first + b'{"id": ')
+        transfer.Checkpoint(f'{path}.checkpoint').save(
+            offset=len(first), rows=1, last_pk=self.posts[0].pk
+        )
+        rows = transfer.export_data('posts', path, resume=True)
+        self.assertEqual(rows, 5)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), complete)
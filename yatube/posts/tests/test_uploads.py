@@ -0,0 +1,118 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+ORIENTATION = 0x0112
+
+
+def jpeg(size, orientation=None):
+    buffer = BytesIO()
+    image = Image.new('RGB', size, 'blue')
+    exif = Image.Exif()
+    if orientation:
+        exif[ORIENTATION] = orientation
+    image.save(buffer, 'JPEG', exif=exif.tobytes() if orientation else b'')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class BoundedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='photo.jpg', content_type='image/jpeg'):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile(name, content, content_type),
+            },
+        )
+
+    @override_settings(POST_UPLOAD_MAX_BYTES=1024)
+    def test_rejects_large_file(self):
+        """Файл больше лимита отклоняется с ошибкой поля"""
+        response = self.upload(jpeg((400, 400)) + b'\0' * 2048)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_UPLOAD_MAX_PIXELS=10 ** 6)
+    def test_rejects_large_dimensions(self):
+        """Картинка больше лимита пикселей отклоняется по заголовку"""
+        response = self.upload(jpeg((1200, 1000)))
+        self.assertFormError(
+            response, 'form', 'image', 'Изображение больше 1 мегапикселей.'
+        )
+
+    def test_rejects_not_image(self):
+        """Файл, который не картинка, отклоняется"""
+        response = self.upload(b'not an image' * 10)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл не похож на изображение.'
+        )
+
+    @override_settings(
+        POST_UPLOAD_MAX_BYTES=2000,
+        POST_UPLOAD_MAX_PIXELS=10000,
+        POST_UPLOAD_MAX_SIDE=50,
+    )
+    def test_declared_type_is_ignored(self):
+        """Ограничения действуют при любом объявленном типе файла"""
+        buffer = BytesIO()
+        Image.new('RGB', (400, 400), 'blue').save(buffer, 'PNG')
+        response = self.upload(
+            buffer.getvalue(),
+            name='photo.png',
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_UPLOAD_MAX_SIDE=50)
+    def test_octet_stream_image_is_downsized(self):
+        """Картинка, объявленная не как image/*, тоже уменьшается"""
+        self.upload(
+            jpeg((400, 200)), content_type='application/octet-stream'
+        )
+        with Image.open(Post.objects.get().image.path) as image:
+            self.assertEqual(image.size, (50, 25))
+
+    @override_settings(POST_UPLOAD_MAX_SIDE=500)
+    def test_downsizes_and_strips_exif(self):
+        """Большая картинка уменьшается, поворот из EXIF применяется"""
+        # Ориентация 6: снимок повернут, ширина и высота меняются местами.
+        self.upload(jpeg((1000, 600), orientation=6))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (300, 500))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_is_kept(self):
+        """Небольшая картинка без EXIF сохраняется без изменений"""
+        content = jpeg((200, 100))
+        self.upload(content)
+        with open(Post.objects.get().image.path, 'rb') as file:
+            self.assertEqual(file.read(), content)
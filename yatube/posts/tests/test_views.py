@@ -1,20 +1,25 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import OnCommitMixin
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
-class ViewsTests(TestCase):
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ViewsTests(OnCommitMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -95,7 +100,8 @@ class ViewsTests(TestCase):
                 self.assertTemplateUsed(response, template)
 
     def test_index_page_show_correct_context(self):
-        """Шаблон index сформирован с правильным контекстом, кэш работает"""
+        """Шаблон index сформирован с правильным контекстом, кэш работает
+        и сбрасывается при удалении поста"""
         response = self.authorized_client.get(reverse('posts:index'))
         first_object = response.context['page_obj'][0]
         post_text_0 = first_object.text
@@ -113,11 +119,11 @@ class ViewsTests(TestCase):
         )
         response_cache_1 = self.guest_client.get(reverse('posts:index'))
         response_cont_1 = response_cache_1.content
-        Post.objects.filter(id=post_new_extra.id).delete()
+        Post.objects.filter(id=post_new_extra.id).update(text='Без сигналов')
         response_cache_2 = self.guest_client.get(reverse('posts:index'))
         response_cont_2 = response_cache_2.content
         self.assertEqual(response_cont_1, response_cont_2)
-        cache.clear()
+        Post.objects.filter(id=post_new_extra.id).delete()
         response_cache_3 = self.guest_client.get(reverse('posts:index'))
         response_cont_3 = response_cache_3.content
         self.assertNotEqual(response_cont_1, response_cont_3)
@@ -341,3 +347,235 @@ class PaginatorViewsTest(TestCase):
             with self.subTest(rvs=rvs):
                 response = self.guest_client.get(rvs)
                 self.assertEqual(len(response.context['page_obj']), posts_num)
+
+
+@override_settings(CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='NameSurname')
+        Post.objects.bulk_create(
+            Post(text=f'Тестовый пост {i}', author=cls.user)
+            for i in range(13)
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        """Курсорная паджинация листает ленту в обе стороны"""
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(second), self.posts[10:])
+        self.assertFalse(second.has_next())
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), self.posts[:10])
+
+    def test_follow_feed_walks_by_feed_entries(self):
+        """Лента подписок листается по ключу из записей ленты"""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        url = reverse('posts:follow_index')
+        first = self.client.get(url).context['page_obj']
+        self.assertEqual(list(first), self.posts[:10])
+        second = self.client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(second), self.posts[10:])
+        back = self.client.get(
+            url, {'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), self.posts[:10])
+
+    def test_cursor_page_skips_count(self):
+        """Курсорная страница не выполняет COUNT"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(
+            any(
+                query['sql'].startswith('SELECT COUNT(')
+                for query in queries
+            )
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор ведет на первую страницу"""
+        response = self.client.get(reverse('posts:index'), {'cursor': '!!'})
+        self.assertEqual(list(response.context['page_obj']), self.posts[:10])
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Какая-то тестовая группа'
+        )
+        for i in range(20):
+            author = User.objects.create_user(
+                username=f'author{i}',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f'Тестовый пост {i}',
+                author=author,
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=author, text='Коммент')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Число запросов к ленте не зависит от размера страницы"""
+        pages = {
+            reverse('posts:index'): (self.client, 2),
+            reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            ): (self.client, 3),
+            reverse(
+                'posts:profile', kwargs={'username': 'author0'}
+            ): (self.client, 4),
+            reverse('posts:follow_index'): (self.authorized_client, 5),
+        }
+        for url, (client, queries) in pages.items():
+            for page_size in (5, 20):
+                with self.subTest(url=url, page_size=page_size):
+                    cache.clear()
+                    with mock.patch('posts.utils.POSTS_PER_PAGE', page_size):
+                        with self.assertNumQueries(queries):
+                            response = client.get(url)
+                    page_obj = response.context['page_obj']
+                    self.assertEqual(page_obj[0].comments_count, 1)
+
+
+class CachePolicyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other_reader = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Какая-то тестовая группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    @override_settings(
+        VIEW_CACHE_POLICIES={
+            'group_list': {'anonymous': 60, 'authenticated': 0},
+        },
+        POST_CARD_TIMEOUT=0,
+    )
+    def test_anonymous_and_authenticated_variants(self):
+        """Гости и авторизованные пользователи получают свой вариант кэша"""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        Post.objects.create(
+            text='Старый пост', author=self.author, group=self.group
+        )
+        self.client.get(url)
+        Post.objects.update(
+            text='Свежий пост', text_html='<p>Свежий пост</p>'
+        )
+        self.assertNotContains(self.client.get(url), 'Свежий пост')
+        self.assertContains(self.authorized_client.get(url), 'Свежий пост')
+
+    def test_follow_feed_is_cached_per_user(self):
+        """Лента подписок кэшируется отдельно для каждого читателя"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Пост для подписчика', author=self.author)
+        other_client = Client()
+        other_client.force_login(self.other_reader)
+        url = reverse('posts:follow_index')
+        self.assertContains(self.authorized_client.get(url), 'подписчика')
+        self.assertNotContains(other_client.get(url), 'подписчика')
+
+
+class CacheInvalidationTests(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_group',
+            description='Какая-то тестовая группа'
+        )
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_create_refreshes_lists(self):
+        """Новый пост сразу виден на главной, в группе и в профиле"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.author_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Только что опубликован', 'group': self.group.pk},
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), 'Только что опубликован'
+                )
+
+    def test_post_edit_refreshes_detail_and_old_group(self):
+        """Правка поста обновляет его страницу и прежнюю группу"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        group = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(detail)
+        self.client.get(group)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Исправленный текст'},
+        )
+        self.assertContains(self.client.get(detail), 'Исправленный текст')
+        self.assertNotContains(self.client.get(group), 'Исходный текст')
+
+    def test_add_comment_refreshes_detail(self):
+        """Новый комментарий сразу виден на странице поста"""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(detail)
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'},
+        )
+        self.assertContains(self.client.get(detail), 'Свежий комментарий')
+
+    def test_follow_refreshes_feed(self):
+        """Подписка сразу меняет ленту подписок"""
+        url = reverse('posts:follow_index')
+        self.assertNotContains(self.reader_client.get(url), 'Исходный текст')
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertContains(self.reader_client.get(url), 'Исходный текст')
@@ -0,0 +1,30 @@
+from unittest import mock
+
+
+class OnCommitMixin:
+    """Выполняет колбэки transaction.on_commit сразу.
+
+    Транзакция TestCase не фиксируется, и без этого сброс кэша, графа
+    подписок и ленты после записи в тестах не происходил бы. Патч
+    включается до setUpTestData, чтобы покрыть и его.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        patcher = mock.patch(
+            'django.db.transaction.on_commit', lambda callback: callback()
+        )
+        patcher.start()
+        try:
+            super().setUpClass()
+        except Exception:
+            patcher.stop()
+            raise
+        cls.on_commit_patcher = patcher
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.on_commit_patcher.stop()
@@ -0,0 +1,185 @@
+"""Фоновая подготовка превью картинок постов.
+
+После сохранения поста с новой картинкой в очередь (таблица ThumbnailJob)
+ставится задача, и пул потоков готовит все превью из
+settings.POST_THUMBNAILS. Тег {% thumbnail %} работает через
+QueuedThumbnailBackend: готовое превью берется из хранилища sorl, а пока
+его нет, вместо картинки отдается заглушка и запрос не ждет Pillow.
+Вместе с превью готовятся адаптивные варианты картинки (posts.image_variants).
+Задачи, оставшиеся после перезапуска, выполняет команда process_thumbnails.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import quote
+
+from core import metrics
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from . import cache, image_variants
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class ThumbnailPlaceholder(DummyImageFile):
+    """Серая заглушка размером с превью, встроенная в data: URL."""
+
+    @property
+    def url(self):
+        svg = (
+            "<svg xmlns='http://www.w3.org/2000/svg' "
+            f"width='{self.x}' height='{self.y}'>"
+            "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+        )
+        return 'data:image/svg+xml,' + quote(svg)
+
+
+class QueuedThumbnailBackend(ThumbnailBackend):
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        with metrics.timed('thumbnail'):
+            source = ImageFile(file_)
+            name = self.thumbnail_name(source, geometry_string, options)
+            cached = default.kvstore.get(ImageFile(name, default.storage))
+            if cached:
+                return cached
+            enqueue(source.name)
+            return ThumbnailPlaceholder(geometry_string)
+
+    def render(self, file_, geometry_string, **options):
+        """Готовит превью синхронно; вызывается только из очереди."""
+        thumbnail = super().get_thumbnail(file_, geometry_string, **options)
+        if not thumbnail.exists():
+            raise FileNotFoundError(f'Не удалось подготовить превью {file_}')
+        return thumbnail
+
+    def thumbnail_name(self, source, geometry_string, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail, чтобы имя
+        # совпадало с именем файла, который подготовит render().
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def abandoned_before():
+    """Момент, раньше которого взятая задача считается брошенной.
+
+    Так бывает, если обработчик упал, не закончив задачу.
+    """
+    return timezone.now() - timedelta(
+        seconds=settings.THUMBNAIL_RUNNING_TIMEOUT
+    )
+
+
+def claimable():
+    """Условие на задачи, которые можно взять: в очереди и брошенные."""
+    return Q(status=ThumbnailJob.PENDING) | Q(
+        status=ThumbnailJob.RUNNING, updated__lt=abandoned_before()
+    )
+
+
+def enqueue(source, restart=False):
+    """Ставит картинку в очередь; restart перезапускает готовую задачу.
+
+    Без restart задача сначала читается: ждущая в очереди, выполняющаяся
+    и ошибочная не трогаются, поэтому страницы, на которых превью еще
+    нет, не пишут в базу. Готовая задача перезапускается (ее превью
+    пропало из kvstore), брошенная — тоже.
+    """
+    job = ThumbnailJob.objects.filter(source=source).first()
+    if job is None:
+        job, created = ThumbnailJob.objects.get_or_create(source=source)
+        if not created and not restart:
+            return
+    elif (
+        restart
+        or job.status == ThumbnailJob.DONE
+        or job.status == ThumbnailJob.RUNNING
+        and job.updated < abandoned_before()
+    ):
+        ThumbnailJob.objects.filter(pk=job.pk).update(
+            status=ThumbnailJob.PENDING,
+            attempts=0,
+            error='',
+            updated=timezone.now(),
+        )
+    else:
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: executor().submit(_work, job.pk))
+
+
+def _work(job_id):
+    try:
+        process_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def process_job(job_id):
+    """Выполняет задачу, если ее еще не взял другой обработчик."""
+    claimed = ThumbnailJob.objects.filter(claimable(), pk=job_id).update(
+        status=ThumbnailJob.RUNNING,
+        attempts=F('attempts') + 1,
+        updated=timezone.now(),
+    )
+    if not claimed:
+        return
+    job = ThumbnailJob.objects.get(pk=job_id)
+    backend = QueuedThumbnailBackend()
+    started = time.perf_counter()
+    try:
+        for geometry, options in settings.POST_THUMBNAILS:
+            backend.render(job.source, geometry, **options)
+        variants = image_variants.generate(job.source)
+    except Exception as error:
+        logger.exception('Превью для %s не подготовлено', job.source)
+        job.error = str(error)
+        job.status = (
+            ThumbnailJob.FAILED
+            if job.attempts >= settings.THUMBNAIL_MAX_ATTEMPTS
+            else ThumbnailJob.PENDING
+        )
+    else:
+        job.status = ThumbnailJob.DONE
+        job.error = ''
+        logger.info(
+            'Превью для %s готовы за %.1f мс',
+            job.source, (time.perf_counter() - started) * 1000,
+        )
+        posts = Post.objects.filter(image=job.source)
+        posts.update(image_variants=image_variants.dumps(variants))
+        posts = posts.values_list('pk', 'author_id', 'group_id')
+        for post in posts:
+            cache.bump(*cache.post_namespaces(*post))
+    job.save(update_fields=('status', 'error', 'updated'))
@@ -0,0 +1,441 @@
+"""Выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Данные переносятся в JSON Lines или CSV (с заголовком). Пользователи
+указываются по username, группы — по slug, посты и комментарии
+сохраняют свои id, поэтому повторная загрузка того же файла ничего
+не дублирует.
+
+Файлы читаются и пишутся построчно, а строки базы выбираются пачками
+по возрастанию pk, поэтому память не зависит от объема данных.
+После каждой пачки в файл контрольной точки записывается смещение
+в файле данных: прерванную команду можно продолжить с того же места.
+"""
+import csv
+import io
+import json
+import os
+
+from search.engines import COMMENT, POST, get_engine
+
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.fields import NOT_PROVIDED
+from django.utils import timezone
+
+from . import feed
+from .cache import bump
+from .models import Comment, Follow, Group, Post, ThumbnailJob, User
+from .utils import auto_now_add_disabled, batches, render_text
+
+FORMATS = ('jsonl', 'csv')
+
+
+class Transfer:
+    model = None
+    # Колонка файла -> поле для values() при выгрузке.
+    columns = {}
+    # Колонки со ссылками на другие объекты по естественному ключу.
+    references = ()
+    auto_now_add = ()
+    # Что из производных данных затрагивает загрузка (rebuild_derived):
+    # счетчики для recount_stats --counter и лента подписок.
+    counters = ()
+    feed = False
+
+    def export_rows(self, after, batch_size):
+        """Пачки строк с pk больше after, по возрастанию pk."""
+        queryset = self.model.objects.order_by('pk').values_list(
+            'pk', *self.columns.values()
+        )
+        while True:
+            rows = list(queryset.filter(pk__gt=after)[:batch_size])
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield after, [dict(zip(self.columns, row[1:])) for row in rows]
+
+    def convert(self, record):
+        """Приводит значения записи к типам полей модели."""
+        values = {}
+        for column in self.columns:
+            value = record.get(column)
+            if value == '':
+                value = None
+            if column in self.references:
+                values[column] = value
+                continue
+            field = self.model._meta.get_field(column)
+            if value is None and column in self.auto_now_add:
+                value = timezone.now()
+            elif value is None and field.default is not NOT_PROVIDED:
+                value = field.get_default()
+            elif value is None and field.empty_strings_allowed:
+                value = ''
+            values[column] = field.to_python(value)
+        return values
+
+    def build(self, records):
+        """Объекты модели для bulk_create и число пропущенных записей."""
+        raise NotImplementedError
+
+    def after_import(self, objects):
+        """Пространства имен кэша, которые нужно сбросить."""
+        return set()
+
+    def index(self, objects):
+        """Добавляет пачку в поисковый индекс."""
+
+
+def users_by_name(records, *columns):
+    names = {record[column] for record in records for column in columns}
+    return dict(
+        User.objects.filter(username__in=names).values_list('username', 'pk')
+    )
+
+
+class GroupTransfer(Transfer):
+    model = Group
+    columns = {'title': 'title', 'slug': 'slug', 'description': 'description'}
+
+    def build(self, records):
+        return [Group(**record) for record in records], 0
+
+    def after_import(self, objects):
+        return {'index'}
+
+
+class PostTransfer(Transfer):
+    model = Post
+    columns = {
+        'id': 'pk',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }
+    references = ('author', 'group')
+    auto_now_add = ('pub_date',)
+    counters = ('posts_count',)
+    feed = True
+
+    def build(self, records):
+        users = users_by_name(records, 'author')
+        groups = dict(
+            Group.objects.filter(
+                slug__in={record['group'] for record in records}
+            ).values_list('slug', 'pk')
+        )
+        posts = [
+            Post(
+                author_id=users[record['author']],
+                group_id=groups.get(record['group']),
+                text_html=render_text(record['text']),
+                **{
+                    name: record[name]
+                    for name in ('id', 'text', 'pub_date', 'image')
+                },
+            )
+            for record in records if record['author'] in users
+        ]
+        return posts, len(records) - len(posts)
+
+    def after_import(self, objects):
+        # Превью и варианты картинок готовит process_thumbnails.
+        ThumbnailJob.objects.bulk_create(
+            [
+                ThumbnailJob(source=source)
+                for source in {post.image.name for post in objects}
+                if source
+            ],
+            ignore_conflicts=True,
+        )
+        namespaces = {'index'}
+        for post in objects:
+            namespaces.add(f'profile:{post.author_id}')
+            if post.group_id:
+                namespaces.add(f'group:{post.group_id}')
+        return namespaces
+
+    def index(self, objects):
+        # Текст берется из базы: уже существовавшие посты bulk_create
+        # не перезаписал.
+        posts = Post.objects.filter(
+            pk__in=[post.pk for post in objects]
+        ).values_list('pk', 'text')
+        get_engine().index_many(
+            [(POST, pk, pk, text) for pk, text in posts]
+        )
+
+
+class CommentTransfer(Transfer):
+    model = Comment
+    columns = {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }
+    references = ('author',)
+    auto_now_add = ('created',)
+    counters = ('comments_count',)
+
+    def build(self, records):
+        users = users_by_name(records, 'author')
+        posts = set(
+            Post.objects.filter(
+                pk__in={record['post'] for record in records}
+            ).values_list('pk', flat=True)
+        )
+        comments = [
+            Comment(
+                id=record['id'],
+                post_id=record['post'],
+                author_id=users[record['author']],
+                text=record['text'],
+                text_html=render_text(record['text']),
+                created=record['created'],
+            )
+            for record in records
+            if record['author'] in users and record['post'] in posts
+        ]
+        return comments, len(records) - len(comments)
+
+    def after_import(self, objects):
+        return {f'post:{comment.post_id}' for comment in objects}
+
+    def index(self, objects):
+        comments = Comment.objects.filter(
+            pk__in=[comment.pk for comment in objects]
+        ).values_list('pk', 'post_id', 'text')
+        get_engine().index_many(
+            [(COMMENT, pk, post_id, text) for pk, post_id, text in comments]
+        )
+
+
+class FollowTransfer(Transfer):
+    model = Follow
+    columns = {'user': 'user__username', 'author': 'author__username'}
+    references = ('user', 'author')
+    counters = ('followers_count', 'following_count')
+    feed = True
+
+    def build(self, records):
+        users = users_by_name(records, 'user', 'author')
+        follows = [
+            Follow(
+                user_id=users[record['user']],
+                author_id=users[record['author']],
+            )
+            for record in records
+            if record['user'] in users and record['author'] in users
+            and record['user'] != record['author']
+        ]
+        return follows, len(records) - len(follows)
+
+    def after_import(self, objects):
+        namespaces = set()
+        for follow in objects:
+            namespaces.add(f'follow:{follow.user_id}')
+            namespaces.add(f'profile:{follow.user_id}')
+            namespaces.add(f'profile:{follow.author_id}')
+        return namespaces
+
+
+TRANSFERS = {
+    'groups': GroupTransfer,
+    'posts': PostTransfer,
+    'comments': CommentTransfer,
+    'follows': FollowTransfer,
+}
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return 'csv' if extension == 'csv' else 'jsonl'
+
+
+def encode(records, columns, data_format, header=False):
+    """Строки файла для записей в виде байтов."""
+    # Даты целиком, с микросекундами: DjangoJSONEncoder их обрезает.
+    records = [
+        {
+            key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in record.items()
+        }
+        for record in records
+    ]
+    if data_format == 'jsonl':
+        return ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ).encode()
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns))
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue().encode()
+
+
+def read_records(file, data_format, offset):
+    """Записи файла начиная с байта offset вместе со смещением после них.
+
+    file открыт в двоичном режиме: по tell() после каждой записи
+    известно, откуда продолжить загрузку. Заголовок CSV читается
+    всегда, даже при продолжении с середины файла.
+    """
+    def lines():
+        for line in iter(file.readline, b''):
+            yield line.decode()
+
+    if data_format == 'jsonl':
+        file.seek(offset)
+        for line in lines():
+            if line.strip():
+                yield json.loads(line), file.tell()
+        return
+    file.seek(0)
+    header = next(csv.reader(lines()), None)
+    if header is None:
+        return
+    if offset > file.tell():
+        file.seek(offset)
+    for row in csv.reader(lines()):
+        yield dict(zip(header, row)), file.tell()
+
+
+class Checkpoint:
+    """Файл контрольной точки: смещение, число строк и последний pk."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {'offset': 0, 'rows': 0, 'last_pk': 0}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def save(self, **state):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def export_data(kind, path, data_format=None, batch_size=10000,
+                checkpoint=None, resume=False, stderr=None):
+    """Выгружает объекты вида kind в файл path и возвращает число строк."""
+    transfer = TRANSFERS[kind]()
+    data_format = data_format or guess_format(path)
+    checkpoint = Checkpoint(checkpoint or f'{path}.checkpoint')
+    state = checkpoint.load() if resume else {
+        'offset': 0, 'rows': 0, 'last_pk': 0,
+    }
+    with open(path, 'ab' if resume else 'wb') as file:
+        # Хвост после последней контрольной точки дописан не до конца.
+        file.truncate(state['offset'])
+        file.seek(state['offset'])
+        if not state['offset'] and data_format == 'csv':
+            file.write(encode([], transfer.columns, data_format, True))
+        for last_pk, records in transfer.export_rows(
+            state['last_pk'], batch_size
+        ):
+            file.write(encode(records, transfer.columns, data_format))
+            file.flush()
+            state = {
+                'offset': file.tell(),
+                'rows': state['rows'] + len(records),
+                'last_pk': last_pk,
+            }
+            checkpoint.save(**state)
+            progress(stderr, kind, state['rows'])
+    checkpoint.remove()
+    return state['rows']
+
+
+def import_data(kind, path, data_format=None, batch_size=1000,
+                checkpoint=None, resume=False, derived=True, stdout=None,
+                stderr=None):
+    """Загружает объекты вида kind из файла path.
+
+    Возвращает пару (загружено, пропущено): пропускаются записи
+    со ссылками на отсутствующих пользователей, группы и посты.
+    Загруженными считаются и записи, которые уже были в базе.
+    """
+    transfer = TRANSFERS[kind]()
+    data_format = data_format or guess_format(path)
+    checkpoint = Checkpoint(checkpoint or f'{path}.checkpoint')
+    state = checkpoint.load() if resume else {'offset': 0, 'rows': 0}
+    skipped = state.get('skipped', 0)
+    fields = [
+        transfer.model._meta.get_field(name) for name in transfer.auto_now_add
+    ]
+    with open(path, 'rb') as file:
+        for batch in batches(
+            read_records(file, data_format, state['offset']), batch_size
+        ):
+            records = [transfer.convert(record) for record, _ in batch]
+            objects, missing = transfer.build(records)
+            with transaction.atomic(), auto_now_add_disabled(*fields):
+                transfer.model.objects.bulk_create(
+                    objects, ignore_conflicts=True
+                )
+                namespaces = transfer.after_import(objects)
+                if derived:
+                    transfer.index(objects)
+            bump(*namespaces)
+            skipped += missing
+            state = {
+                'offset': batch[-1][1],
+                'rows': state['rows'] + len(objects),
+                'skipped': skipped,
+            }
+            checkpoint.save(**state)
+            progress(stderr, kind, state['rows'], skipped)
+    reset_sequences(transfer.model)
+    if derived:
+        rebuild_derived(transfer, stdout)
+    checkpoint.remove()
+    return state['rows'], skipped
+
+
+def progress(stderr, kind, rows, skipped=0):
+    if stderr is None:
+        return
+    message = f'{kind}: {rows}'
+    if skipped:
+        message += f', пропущено {skipped}'
+    stderr.write(message)
+
+
+def reset_sequences(model):
+    """Сдвигает счетчик первичного ключа за загруженные явные id."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived(transfer, stdout=None):
+    """Пересчитывает данные, которые bulk_create обходит мимо сигналов.
+
+    Пересчитывается только то, что затрагивает загруженный вид объектов,
+    пачками в отдельных транзакциях; поисковый индекс пополняется
+    при загрузке каждой пачки.
+    """
+    if transfer.counters:
+        call_command(
+            'recount_stats',
+            counter=list(transfer.counters),
+            stdout=stdout or io.StringIO(),
+        )
+    if transfer.feed:
+        feed.rebuild()
@@ -0,0 +1,146 @@
+"""Потоковая загрузка картинок с ограничениями по объему и размеру.
+
+BoundedImageUploadHandler принимает все загружаемые файлы, какой бы тип
+ни объявил клиент (единственное файловое поле — картинка поста): пишет их
+во временный файл, который до FILE_UPLOAD_MAX_MEMORY_SIZE остается
+в памяти, по первым килобайтам читает заголовок картинки и прекращает
+запись, как только файл выходит за POST_UPLOAD_MAX_BYTES или
+POST_UPLOAD_MAX_PIXELS. Картинка ли это, решает заголовок, а не
+объявленный тип; он заменяется типом найденного формата. Вместо
+отклоненного файла форма получает RejectedUpload с текстом ошибки.
+Принятые картинки без EXIF и не больше POST_UPLOAD_MAX_SIDE
+сохраняются как есть, остальные пережимаются: JPEG декодируется сразу
+в уменьшенном масштабе (Image.draft).
+"""
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+REENCODED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, который не был принят; upload_error — причина."""
+
+    def __init__(self, name, content_type, upload_error):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.upload_error = upload_error
+
+
+class BoundedImageUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.error = None
+        self.header = b''
+        self.image_format = None
+        self.file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        if (self.content_length or 0) > settings.POST_UPLOAD_MAX_BYTES:
+            self.reject_size()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        if start + len(raw_data) > settings.POST_UPLOAD_MAX_BYTES:
+            self.reject_size()
+            return None
+        if self.image_format is None:
+            self.read_header(raw_data)
+            if self.error:
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.error is None and self.image_format is None:
+            self.reject('Файл не похож на изображение.')
+        if self.error:
+            self.file.close()
+            return RejectedUpload(
+                self.file_name, self.content_type, self.error
+            )
+        self.file.seek(0)
+        self.content_type = Image.MIME.get(
+            self.image_format, 'application/octet-stream'
+        )
+        upload = UploadedFile(
+            self.file, self.file_name, self.content_type, file_size,
+            self.charset, self.content_type_extra,
+        )
+        try:
+            return normalize(upload)
+        except (OSError, SyntaxError):
+            upload.close()
+            return RejectedUpload(
+                self.file_name, self.content_type, 'Файл поврежден.'
+            )
+
+    def read_header(self, raw_data):
+        # Image.open читает только заголовок и не выделяет память
+        # под пиксели, поэтому размер известен до загрузки всего файла.
+        self.header += raw_data
+        try:
+            image = Image.open(BytesIO(self.header))
+        except Image.DecompressionBombError:
+            self.reject_pixels()
+            return
+        except (OSError, SyntaxError):
+            if len(self.header) > settings.POST_UPLOAD_HEADER_BYTES:
+                self.reject('Файл не похож на изображение.')
+            return
+        self.header = b''
+        self.image_format = image.format
+        if image.width * image.height > settings.POST_UPLOAD_MAX_PIXELS:
+            self.reject_pixels()
+
+    def reject(self, error):
+        self.error = error
+        self.header = b''
+
+    def reject_size(self):
+        limit = filesizeformat(settings.POST_UPLOAD_MAX_BYTES)
+        self.reject(f'Файл больше {limit}.')
+
+    def reject_pixels(self):
+        limit = settings.POST_UPLOAD_MAX_PIXELS // 10 ** 6
+        self.reject(f'Изображение больше {limit} мегапикселей.')
+
+
+def normalize(upload):
+    """Убирает EXIF и уменьшает слишком большую картинку.
+
+    Поворот из EXIF применяется к пикселям, поэтому снимок с телефона
+    не ложится набок. Картинки, которые менять не нужно, и форматы
+    вне REENCODED_FORMATS (например, анимированный GIF) не трогаются.
+    """
+    max_side = settings.POST_UPLOAD_MAX_SIDE
+    image = Image.open(upload)
+    if image.format not in REENCODED_FORMATS or (
+        max(image.size) <= max_side and 'exif' not in image.info
+    ):
+        upload.seek(0)
+        return upload
+    image_format = image.format
+    image.draft(image.mode, (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    image.info.pop('exif', None)
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image.save(
+        output, image_format, quality=settings.POST_UPLOAD_QUALITY
+    )
+    size = output.tell()
+    output.seek(0)
+    upload.close()
+    return UploadedFile(
+        output, upload.name, upload.content_type, size,
+        upload.charset, upload.content_type_extra,
+    )
@@ -1,10 +1,203 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.utils.functional import SimpleLazyObject
+from django.utils.html import linebreaks
 
-from .constants import POSTS_PER_PAGE
+from .constants import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 
-def pagination(request, value):
+def pagination(request, value, ordering=('-pub_date', '-pk')):
+    if settings.CURSOR_PAGINATION:
+        paginator = CursorPaginator(value, POSTS_PER_PAGE, ordering)
+        return paginator.get_page(request.GET.get('cursor'))
     paginator = Paginator(value, POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def render_text(text):
+    """HTML текста поста или комментария, как у фильтра linebreaks."""
+    return linebreaks(text, autoescape=True)
+
+
+def comment_pagination(request, post):
+    """Страница комментариев поста: первая или следующая по ?cursor=.
+
+    Страница выбирается при первом обращении из шаблона, поэтому при
+    попадании в кэш фрагмента запроса к базе нет.
+    """
+    comments = post.comments.select_related('author').only(
+        'text', 'text_html', 'created', 'post_id', 'author__username'
+    )
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, ordering=('-created', '-pk')
+    )
+    return SimpleLazyObject(
+        lambda: paginator.get_page(request.GET.get('cursor'))
+    )
+
+
+@contextmanager
+def auto_now_add_disabled(*fields):
+    """Позволяет записать свои значения в поля с auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(items, size):
+    """Разбивает итерируемый объект на списки длиной не больше size."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (keyset) без COUNT и OFFSET.
+
+    Страница выбирается условием «после последней записи предыдущей
+    страницы» по полям ordering, поэтому глубокие страницы стоят столько
+    же, сколько первая. Курсор — непрозрачный токен с направлением
+    и значениями полей граничной записи. Поле через связь
+    ('feed_entries__pub_date') читается и сравнивается по аннотации:
+    новый filter() по многозначной связи добавил бы второе соединение.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-pk')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.keys = [self._key(name) for name in self.fields]
+        self.ordering = [
+            name[:-len(field)] + key
+            for name, field, key in zip(ordering, self.fields, self.keys)
+        ]
+
+    def get_page(self, cursor=None):
+        backwards, values = self.decode(cursor)
+        ordering = self.ordering
+        if backwards:
+            ordering = [self._reverse(name) for name in ordering]
+        queryset = self.object_list.annotate(**{
+            key: F(field)
+            for field, key in zip(self.fields, self.keys)
+            if key != field
+        }).order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=self.encode(rows[-1]) if has_next and rows else None,
+            previous_cursor=(
+                self.encode(rows[0], backwards=True)
+                if has_previous and rows else None
+            ),
+        )
+
+    def encode(self, obj, backwards=False):
+        values = []
+        for field, key in zip(self.fields, self.keys):
+            if key == field:
+                key = self._field(field).attname if field != 'pk' else key
+            value = getattr(obj, key)
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        payload = json.dumps([int(backwards), values]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode(self, cursor):
+        if not cursor:
+            return False, None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            backwards, values = json.loads(base64.urlsafe_b64decode(padded))
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError):
+            return False, None
+        if len(values) != len(self.fields):
+            return False, None
+        return bool(backwards), values
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        *relations, name = name.split('__')
+        for relation in relations:
+            opts = opts.get_field(relation).related_model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    @staticmethod
+    def _key(field):
+        return 'cursor_' + field.replace('__', '_') if '__' in field else field
+
+    @staticmethod
+    def _reverse(name):
+        return name[1:] if name.startswith('-') else f'-{name}'
+
+    @staticmethod
+    def _after(ordering, values):
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+
+class CursorPage(Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
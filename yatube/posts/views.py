@@ -1,86 +1,184 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
+from . import follow_graph
+from .cache import cache_policy, conditional_page
+from .counters import get_stats
+from .feed import feed_posts
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import pagination
-from .constants import TITLE_SIZE
+from .utils import CursorPaginator, comment_pagination, pagination
+from .constants import FOLLOWS_PER_PAGE, TITLE_SIZE
 
 
+def group_namespaces(request, slug):
+    group = request.page_object = Group.objects.filter(slug=slug).first()
+    return None if group is None else (f'group:{group.pk}',)
+
+
+def profile_namespaces(request, username):
+    author = request.page_object = User.objects.filter(
+        username=username
+    ).first()
+    return None if author is None else (f'profile:{author.pk}',)
+
+
+def post_namespaces(request, post_id):
+    post = request.page_object = Post.objects.select_related(
+        'author__stats', 'group'
+    ).filter(pk=post_id).first()
+    if post is None:
+        return None
+    return (f'post:{post.pk}', f'profile:{post.author_id}')
+
+
+def page_object(request, queryset, **lookup):
+    """Объект страницы, найденный еще при проверке условного GET."""
+    obj = getattr(request, 'page_object', None)
+    return obj if obj is not None else get_object_or_404(queryset, **lookup)
+
+
+@conditional_page(lambda request: ('index',))
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     title = 'Последние обновления на сайте'
     page_obj = pagination(request, post_list)
     context = {
         'title': title,
         'text': 'Последние обновления на сайте',
         'page_obj': page_obj,
+        'cache_policy': cache_policy(request, 'index', 'index'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(group_namespaces)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group__slug=slug)
+    group = page_object(request, Group, slug=slug)
+    post_list = Post.objects.for_feed().filter(group=group)
     page_obj = pagination(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_policy': cache_policy(
+            request, 'group_list', f'group:{group.pk}'
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional_page(profile_namespaces)
 def profile(request, username):
     user = request.user
-    author = get_object_or_404(User, username=username)
+    author = page_object(request, User, username=username)
     title = f'Профайл пользователя {author}'
-    posts = author.posts.all()
+    posts = author.posts.for_feed()
     page_obj = pagination(request, posts)
+    stats = get_stats(author)
     context = {
         'author': author,
-        'posts_num': posts.count(),
+        'posts_num': stats.posts_count,
+        'followers_num': stats.followers_count,
+        'following_num': stats.following_count,
         'page_obj': page_obj,
         'posts': posts,
         'title': title,
+        'cache_policy': cache_policy(
+            request, 'profile', f'profile:{author.pk}'
+        ),
     }
     if user.is_authenticated:
-        following = Follow.objects.filter(
-            user=user,
-            author=author
-        ).exists()
-        context['following'] = following
+        context['following'] = follow_graph.is_following(
+            user, [author.pk]
+        )[author.pk]
     return render(request, 'posts/profile.html', context)
 
 
+def follow_list(request, username, field, title):
+    """Подписчики или подписки пользователя с кнопками для читателя.
+
+    field — сторона Follow, на которой стоят показываемые люди.
+    """
+    author = get_object_or_404(User, username=username)
+    other = 'author' if field == 'user' else 'user'
+    follows = Follow.objects.filter(**{other: author}).select_related(field)
+    page_obj = CursorPaginator(
+        follows, FOLLOWS_PER_PAGE, ordering=('-pk',)
+    ).get_page(request.GET.get('cursor'))
+    people = [getattr(follow, field) for follow in page_obj]
+    following = follow_graph.is_following(
+        request.user, [person.pk for person in people]
+    )
+    context = {
+        'author': author,
+        'title': f'{title} {author}',
+        'people': [(person, following[person.pk]) for person in people],
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def followers(request, username):
+    return follow_list(request, username, 'user', 'Подписчики')
+
+
+def following(request, username):
+    return follow_list(request, username, 'author', 'Подписки')
+
+
+@conditional_page(post_namespaces)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = page_object(
+        request,
+        Post.objects.select_related('author__stats', 'group'),
+        pk=post_id
+    )
     title = f'Пост {post.text[:TITLE_SIZE]}'
-    posts_num = Post.objects.filter(author=post.author).count()
+    posts_num = get_stats(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comment_pagination(request, post)
     context = {
         'title': title,
         'form': form,
         'posts_num': posts_num,
         'post': post,
         'comments': comments,
+        'cache_policy': cache_policy(
+            request,
+            'post_detail',
+            f'post:{post.pk}',
+            f'profile:{post.author_id}',
+        ),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_page(post_namespaces)
+def post_comments(request, post_id):
+    """Следующая страница комментариев для кнопки «Показать еще»."""
+    post = page_object(request, Post, pk=post_id)
+    context = {
+        'post': post,
+        'comments': comment_pagination(request, post),
+        'cache_policy': cache_policy(
+            request, 'post_detail', f'post:{post.pk}'
+        ),
+    }
+    return render(request, 'posts/comments.html', context)
+
+
 @login_required
 def post_create(request):
     user = request.user
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None
+    )
     if request.method == 'POST':
-        form = PostForm(
-            request.POST or None,
-            files=request.FILES or None
-        )
         if form.is_valid():
             v_form = form.save(commit=False)
             v_form.author = user
             v_form.save()
             return redirect(f'/profile/{user.username}/')
-    form = PostForm()
     context = {
         'form': form,
         'is_edit': False,
@@ -125,12 +223,15 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     user = request.user
-    author = Post.objects.filter(author__following__user=user)
+    posts, ordering = feed_posts(user)
     title = 'Ваши подписки'
-    page_obj = pagination(request, author)
+    page_obj = pagination(request, posts.for_feed(), ordering)
     context = {
         'page_obj': page_obj,
         'title': title,
+        'cache_policy': cache_policy(
+            request, 'follow_index', 'index', f'follow:{user.pk}'
+        ),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -0,0 +1,218 @@
+"""Поисковые движки: обратный индекс постов и комментариев.
+
+Индексируются документы двух видов — посты и комментарии; каждый
+документ знает свой пост, и в выдачу попадают посты, отсортированные
+по лучшей оценке среди своих документов. Движок выбирается настройкой
+SEARCH_ENGINE; для другой базы достаточно реализовать SearchEngine.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from posts.utils import batches
+
+from .stemmer import terms
+
+POST = 'post'
+COMMENT = 'comment'
+
+_engine = None
+
+
+class InSubquery(RawSQL):
+    """Подзапрос для lookup __in.
+
+    Скобки ставит сам lookup: со второй парой, как у RawSQL, SQLite
+    читает IN ((SELECT ...)) как скалярный подзапрос и берет одну строку.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class SearchEngine:
+    def index(self, kind, object_id, post_id, text):
+        """Добавляет документ в индекс или заменяет прежнюю версию."""
+        raise NotImplementedError
+
+    def index_many(self, documents):
+        """index для пачки документов (kind, object_id, post_id, text)."""
+        for document in documents:
+            self.index(*document)
+
+    def remove(self, kind, object_id):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, query):
+        """Число постов, найденных по запросу."""
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        """Идентификаторы найденных постов по убыванию релевантности."""
+        raise NotImplementedError
+
+    def match(self, query, kind):
+        """Идентификаторы всех найденных документов вида kind для pk__in.
+
+        Лучше вернуть подзапрос, а не список: у частого слова совпадений
+        больше, чем параметров, которые принимает запрос.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, posts, comments):
+        self.clear()
+        for pk, text in posts.values_list('pk', 'text').iterator():
+            self.index(POST, pk, pk, text)
+        for pk, post_id, text in comments.values_list(
+            'pk', 'post_id', 'text'
+        ).iterator():
+            self.index(COMMENT, pk, post_id, text)
+
+
+class Fts5Engine(SearchEngine):
+    """Полнотекстовый индекс SQLite FTS5 с ранжированием bm25.
+
+    В индекс пишутся основы слов (search.stemmer), потому что
+    встроенные токенизаторы FTS5 не знают русской морфологии.
+    Слова запроса ищутся как префиксы основ.
+    """
+    table = 'search_document'
+
+    def execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def rowid(self, kind, object_id):
+        # Номер строки вычисляется по документу, поэтому замена
+        # и удаление ищут строку по rowid, а не перебором таблицы.
+        return object_id * 2 + (kind == COMMENT)
+
+    def index(self, kind, object_id, post_id, text):
+        self.remove(kind, object_id)
+        self.insert([(kind, object_id, post_id, text)])
+
+    def index_many(self, documents):
+        if not documents:
+            return
+        rowids = [self.rowid(kind, pk) for kind, pk, _, _ in documents]
+        self.execute(
+            f'DELETE FROM {self.table} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(rowids))})',
+            rowids,
+        )
+        self.insert(documents)
+
+    def insert(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} '
+                '(rowid, body, kind, object_id, post_id) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (
+                        self.rowid(kind, object_id),
+                        ' '.join(terms(text)),
+                        kind,
+                        object_id,
+                        post_id,
+                    )
+                    for kind, object_id, post_id, text in documents
+                ],
+            )
+
+    def remove(self, kind, object_id):
+        self.execute(
+            f'DELETE FROM {self.table} WHERE rowid = %s',
+            (self.rowid(kind, object_id),),
+        )
+
+    def clear(self):
+        self.execute(f'DELETE FROM {self.table}')
+
+    def rebuild(self, posts, comments, batch_size=1000):
+        self.clear()
+        documents = (
+            (POST, pk, pk, text)
+            for pk, text in posts.values_list('pk', 'text').iterator()
+        )
+        for batch in batches(documents, batch_size):
+            self.insert(batch)
+        documents = (
+            (COMMENT, pk, post_id, text)
+            for pk, post_id, text in comments.values_list(
+                'pk', 'post_id', 'text'
+            ).iterator()
+        )
+        for batch in batches(documents, batch_size):
+            self.insert(batch)
+
+    def expression(self, query):
+        # Каждая основа в кавычках: символы запроса не становятся
+        # операторами FTS5.
+        return ' '.join(f'"{term}"*' for term in terms(query))
+
+    def count(self, query):
+        expression = self.expression(query)
+        if not expression:
+            return 0
+        return self.execute(
+            f'SELECT COUNT(DISTINCT post_id) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s',
+            (expression,),
+        )[0][0]
+
+    def search(self, query, offset, limit):
+        expression = self.expression(query)
+        if not expression:
+            return []
+        # bm25 нельзя передать в агрегат напрямую: LIMIT -1 не дает
+        # SQLite развернуть подзапрос.
+        rows = self.execute(
+            'SELECT post_id, MIN(score) AS best FROM ('
+            f'  SELECT post_id, bm25({self.table}) * CASE kind'
+            '     WHEN %s THEN %s ELSE 1 END AS score'
+            f'  FROM {self.table} WHERE {self.table} MATCH %s LIMIT -1'
+            ') GROUP BY post_id ORDER BY best, post_id DESC '
+            'LIMIT %s OFFSET %s',
+            (POST, settings.SEARCH_POST_WEIGHT, expression, limit, offset),
+        )
+        return [row[0] for row in rows]
+
+    def match(self, query, kind):
+        expression = self.expression(query)
+        if not expression:
+            return []
+        return InSubquery(
+            f'SELECT object_id FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND kind = %s',
+            (expression, kind),
+        )
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = import_string(settings.SEARCH_ENGINE)()
+    return _engine
+
+
+class PostSearchResults:
+    """Найденные посты для Paginator: считаются и выбираются по срезам."""
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+
+    def count(self):
+        return get_engine().count(self.query)
+
+    def __getitem__(self, page):
+        ids = get_engine().search(
+            self.query, page.start, page.stop - page.start
+        )
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
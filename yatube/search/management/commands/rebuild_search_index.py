@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.models import Comment, Post
+
+from search.engines import get_engine
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_engine().rebuild(Post.objects.all(), Comment.objects.all())
+        self.stdout.write('Поисковый индекс перестроен')
@@ -0,0 +1,53 @@
+from django.db import migrations
+from posts.utils import batches
+
+from search.stemmer import terms
+
+
+def reindex(apps, schema_editor):
+    # Документы адресуются вычисляемым rowid (Fts5Engine.rowid); таблица
+    # могла быть заполнена прежней 0001 с произвольными rowid.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    documents = (
+        ('post', pk, pk, text)
+        for pk, text in Post.objects.values_list('pk', 'text').iterator()
+    )
+    comments = (
+        ('comment', pk, post_id, text)
+        for pk, post_id, text in Comment.objects.values_list(
+            'pk', 'post_id', 'text'
+        ).iterator()
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DELETE FROM search_document')
+        for source in (documents, comments):
+            for batch in batches(source, 1000):
+                cursor.executemany(
+                    'INSERT INTO search_document '
+                    '(rowid, kind, object_id, post_id, body) '
+                    'VALUES (%s, %s, %s, %s, %s)',
+                    [
+                        (
+                            pk * 2 + (kind == 'comment'),
+                            kind,
+                            pk,
+                            post_id,
+                            ' '.join(terms(text)),
+                        )
+                        for kind, pk, post_id, text in batch
+                    ],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
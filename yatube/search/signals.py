@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from posts.models import Comment, Post
+
+from .engines import COMMENT, POST, get_engine
+
+
+def text_changed(update_fields):
+    return update_fields is None or 'text' in update_fields
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields, **kwargs):
+    if text_changed(update_fields):
+        get_engine().index(POST, instance.pk, instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post(sender, instance, **kwargs):
+    get_engine().remove(POST, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, update_fields, **kwargs):
+    if text_changed(update_fields):
+        get_engine().index(
+            COMMENT, instance.pk, instance.post_id, instance.text
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment(sender, instance, **kwargs):
+    get_engine().remove(COMMENT, instance.pk)
@@ -0,0 +1,116 @@
+"""Стеммер Snowball для русского языка и разбиение текста на слова.
+
+Одинаково применяется к индексируемому тексту и к запросу, поэтому
+«котов», «коты» и «кота» находятся по любой из этих форм.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+
+def _endings(words):
+    return sorted(words.split(), key=len, reverse=True)
+
+
+PERFECTIVE_GERUND = (
+    _endings('в вши вшись'),
+    _endings('ив ивши ившись ыв ывши ывшись'),
+)
+ADJECTIVE = _endings(
+    'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых '
+    'ую юю ая яя ою ею'
+)
+PARTICIPLE = (_endings('ем нн вш ющ щ'), _endings('ивш ывш ующ'))
+REFLEXIVE = _endings('ся сь')
+VERB = (
+    _endings('ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно'),
+    _endings(
+        'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло '
+        'ено ят ует уют ит ыт ены ить ыть ишь ую ю'
+    ),
+)
+NOUN = _endings(
+    'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем '
+    'ам ом о у ах иях ях ы ь ию ью ю ия ья я'
+)
+DERIVATIONAL = _endings('ост ость')
+SUPERLATIVE = _endings('ейш ейше')
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in VOWELS and word[i] not in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings, after_a=()):
+    """Снимает самое длинное окончание, целиком лежащее после start.
+
+    Окончания after_a снимаются, только если перед ними стоит «а» или «я».
+    """
+    candidates = [(ending, False) for ending in endings]
+    candidates += [(ending, True) for ending in after_a]
+    candidates.sort(key=lambda item: len(item[0]), reverse=True)
+    for ending, needs_a in candidates:
+        cut = len(word) - len(ending)
+        if not word.endswith(ending) or cut < start:
+            continue
+        if needs_a and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            continue
+        return word[:cut], True
+    return word, False
+
+
+def _strip_adjectival(word, rv):
+    word, found = _strip(word, rv, ADJECTIVE)
+    if found:
+        word, _ = _strip(word, rv, PARTICIPLE[1], PARTICIPLE[0])
+    return word, found
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    # Шаг 1.
+    word, found = _strip(
+        word, rv, PERFECTIVE_GERUND[1], PERFECTIVE_GERUND[0]
+    )
+    if not found:
+        word, _ = _strip(word, rv, REFLEXIVE)
+        word, found = _strip_adjectival(word, rv)
+        if not found:
+            word, found = _strip(word, rv, VERB[1], VERB[0])
+        if not found:
+            word, _ = _strip(word, rv, NOUN)
+    # Шаг 2.
+    word, _ = _strip(word, rv, ('и',))
+    # Шаг 3.
+    word, _ = _strip(word, r2, DERIVATIONAL)
+    # Шаг 4.
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        return word[:-1]
+    word, found = _strip(word, rv, SUPERLATIVE)
+    if found:
+        if word.endswith('нн') and len(word) - 1 >= rv:
+            word = word[:-1]
+        return word
+    word, _ = _strip(word, rv, ('ь',))
+    return word
+
+
+def terms(text):
+    """Основы слов текста в порядке их появления."""
+    return [stem(word) for word in WORD_RE.findall(text)]
@@ -0,0 +1,140 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from posts.models import Comment, Post
+
+from .engines import COMMENT, POST, get_engine
+from .stemmer import stem, terms
+
+User = get_user_model()
+
+
+class StemmerTests(SimpleTestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова сводятся к одной основе"""
+        for forms in (
+            ('кот', 'кота', 'котов', 'коты'),
+            ('важной', 'важную', 'важный'),
+            ('ёлка', 'елки', 'Ёлкой'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_terms_split_text(self):
+        """Текст разбивается на слова без знаков препинания"""
+        self.assertEqual(terms('Кошки, собаки!'), ['кошк', 'собак'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 есть только в SQLite')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.cat_post = Post.objects.create(
+            text='Наш кот любит спать на окне', author=cls.author
+        )
+        cls.dog_post = Post.objects.create(
+            text='Собака гуляет во дворе', author=cls.author
+        )
+        Comment.objects.create(
+            post=cls.dog_post, author=cls.author, text='А у соседей кошки'
+        )
+
+    def found(self, query):
+        return get_engine().search(query, 0, 10)
+
+    def matched(self, model, query, kind):
+        return model.objects.filter(
+            pk__in=get_engine().match(query, kind)
+        ).count()
+
+    def test_finds_word_forms(self):
+        """Поиск находит посты по другой форме слова"""
+        self.assertEqual(self.found('котов'), [self.cat_post.pk])
+        self.assertEqual(self.found('собаки'), [self.dog_post.pk])
+
+    def test_comment_finds_post_and_post_ranks_higher(self):
+        """Совпадение в комментарии ранжируется ниже совпадения в тексте"""
+        self.assertEqual(self.found('кош'), [self.dog_post.pk])
+        Post.objects.create(text='Кошки и коты', author=self.author)
+        self.assertEqual(self.found('кошки')[-1], self.dog_post.pk)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении"""
+        self.cat_post.text = 'Теперь здесь про попугаев'
+        self.cat_post.save()
+        self.assertEqual(self.found('кот'), [])
+        self.assertEqual(self.found('попугай'), [self.cat_post.pk])
+        Comment.objects.get().delete()
+        self.assertEqual(get_engine().count('кошки'), 0)
+        self.dog_post.delete()
+        self.assertEqual(get_engine().count('собака'), 0)
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        for query in ('"кот', 'кот OR', 'NEAR(кот)', '*', '-'):
+            with self.subTest(query=query):
+                get_engine().count(query)
+                self.found(query)
+
+    def test_view_paginates_results(self):
+        """Страница поиска выводит найденные посты постранично"""
+        for number in range(12):
+            Post.objects.create(text=f'Кот номер {number}', author=self.author)
+        with mock.patch('search.views.POSTS_PER_PAGE', 10):
+            response = self.client.get(reverse('search:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 13)
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;page=2')
+        response = self.client.get(
+            reverse('search:search'), {'q': 'кот', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_view_without_query(self):
+        """Без запроса страница поиска показывает только форму"""
+        response = self.client.get(reverse('search:search'))
+        self.assertTemplateUsed(response, 'search/search.html')
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идет по индексу"""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котом'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.cat_post]
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'кошка'}
+        )
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_match_is_a_subquery(self):
+        """Совпадения передаются подзапросом, а не списком параметров"""
+        posts = Post.objects.bulk_create(
+            Post(text='Кот', author=self.author) for _ in range(1500)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        found = Post.objects.filter(pk__in=get_engine().match('кот', POST))
+        sql, params = found.query.sql_with_params()
+        self.assertIn('MATCH', sql)
+        self.assertEqual(len(params), 2)
+        self.assertEqual(found.count(), len(posts) + 1)
+
+    def test_rebuild_command(self):
+        """Команда rebuild_search_index восстанавливает индекс"""
+        get_engine().clear()
+        self.assertEqual(self.found('кот'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('кот'), [self.cat_post.pk])
+        self.assertEqual(self.matched(Comment, 'кошки', COMMENT), 1)
+        self.assertEqual(self.matched(Post, 'кошки', POST), 0)
@@ -0,0 +1,22 @@
+from django.core.paginator import Paginator
+from django.shortcuts import render
+from django.utils.http import urlencode
+from posts.constants import POSTS_PER_PAGE
+from posts.models import Post
+
+from .engines import PostSearchResults
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        results = PostSearchResults(query, Post.objects.for_feed())
+        paginator = Paginator(results, POSTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'search/search.html', context)
@@ -11,9 +11,12 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 from dotenv import load_dotenv
 
+from core.cache import cache_config, instrumented
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 load_dotenv()
@@ -33,6 +36,8 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'search.apps.SearchConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -43,6 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.connections.ConnectionPoolMiddleware',
+    'core.db.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,12 +63,25 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Кэширующий загрузчик разбирает каждый шаблон один раз на процесс.
+# При DEBUG он выключен, чтобы правки шаблонов были видны сразу;
+# переменная окружения TEMPLATE_CACHE включает или выключает его явно.
+TEMPLATE_CACHE = os.environ.get(
+    'TEMPLATE_CACHE', '0' if DEBUG else '1'
+) == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATE_CACHE else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -78,11 +99,68 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
     }
 }
 
+# Соединения с базой (core.connections) живут CONN_MAX_AGE секунд
+# и проверяются перед каждым запросом, если включен
+# DATABASE_HEALTH_CHECKS. Одновременно с базой работают не больше
+# DATABASE_POOL_SIZE запросов воркера (0 — без ограничения); остальные
+# ждут до DATABASE_POOL_TIMEOUT секунд и получают ответ 503.
+DATABASE_HEALTH_CHECKS = True
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 0))
+DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 5))
+
+# Режим SQLite под нагрузкой (core.sqlite): PRAGMA для каждого нового
+# соединения и транзакции, которые сразу берут блокировку записи
+# (BEGIN IMMEDIATE) и ждут занятую базу busy_timeout миллисекунд.
+# Выключается переменной окружения SQLITE_TUNING=0.
+SQLITE_TUNING = os.environ.get('SQLITE_TUNING', '1') != '0'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'temp_store': 'memory',
+}
+
+# Реплики для чтения (core.db): пути к копиям базы через запятую
+# в переменной окружения DATABASE_REPLICAS. Чтение моделей REPLICA_APPS
+# идет на реплики, а после записи пользователь на REPLICA_STICKY_SECONDS
+# секунд закрепляется за основной базой. Пользователи — модели auth.
+REPLICA_PATHS = [
+    path for path in os.environ.get('DATABASE_REPLICAS', '').split(',')
+    if path
+]
+DATABASES.update({
+    f'replica{number}': {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    for number, path in enumerate(REPLICA_PATHS)
+})
+DATABASE_REPLICAS = [
+    f'replica{number}' for number in range(len(REPLICA_PATHS))
+]
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+REPLICA_APPS = ('posts', 'users', 'about', 'auth')
+REPLICA_STICKY_SECONDS = 10
+REPLICA_COOKIE = 'use_primary'
+
+# Сессии (core.sessions): гостей — в подписанной cookie, пользователей —
+# в кэше SESSION_CACHE_ALIAS с записью в базу. Кэш должен быть общим для
+# воркеров (CACHE_URL=redis://...): с кэшем в памяти процесса сессии
+# пользователей читаются из базы. Переменная окружения
+# SESSION_ENGINE заменяет хранилище, например на
+# django.contrib.sessions.backends.db.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'core.sessions')
+SESSION_CACHE_ALIAS = 'default'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -120,7 +198,123 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': instrumented(cache_config(
+        os.environ.get('CACHE_URL', 'locmem://'),
+        KEY_PREFIX='yatube',
+    )),
+}
+
+# Время жизни (в секундах) кэшированных фрагментов страниц для гостей
+# и авторизованных пользователей; 0 отключает кэш. per_user разделяет
+# кэш между пользователями, если страница у каждого своя. Фрагменты
+# сбрасываются при изменении данных (posts.cache), поэтому время жизни
+# может быть долгим.
+VIEW_CACHE_POLICIES = {
+    'index': {'anonymous': 3600, 'authenticated': 3600},
+    'group_list': {'anonymous': 3600, 'authenticated': 3600},
+    'profile': {'anonymous': 3600, 'authenticated': 3600},
+    'post_detail': {'anonymous': 3600, 'authenticated': 3600},
+    'follow_index': {'authenticated': 3600, 'per_user': True},
+}
+# Карточки постов в лентах и поиске кэшируются по отдельности
+# (posts.cache.post_cards) на POST_CARD_TIMEOUT секунд; 0 отключает кэш.
+POST_CARD_TIMEOUT = 3600
+
+# Лента подписок раскладывается по читателям при публикации поста.
+# Посты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+# не раскладываются, а подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 1000
+# Когда автор перестает быть «знаменитостью», по лентам подписчиков
+# раскладываются только FEED_REFILL_SIZE его последних постов.
+FEED_REFILL_SIZE = 50
+# Множества подписок (posts.follow_graph) хранятся в кэше
+# FOLLOW_GRAPH_TIMEOUT секунд и сбрасываются при подписке и отписке.
+FOLLOW_GRAPH_TIMEOUT = 600
+
+# Постраничный вывод лент по курсору (?cursor=) вместо номеров страниц.
+CURSOR_PAGINATION = False
+
+# Превью картинок постов готовятся фоном (posts.thumbnails), а пока они
+# не готовы, в шаблонах показывается заглушка.
+THUMBNAIL_BACKEND = 'posts.thumbnails.QueuedThumbnailBackend'
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Под тестами (manage.py test, pytest) потоки превью не запускаются:
+# иначе они пишут во временный MEDIA_ROOT теста, пока его удаляют.
+# Задачи остаются в очереди для команды process_thumbnails.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+THUMBNAIL_WORKERS = int(
+    os.environ.get('THUMBNAIL_WORKERS', 0 if TESTING else 2)
+)
+THUMBNAIL_MAX_ATTEMPTS = 3
+# Задача, не законченная за столько секунд, считается брошенной упавшим
+# обработчиком и берется заново.
+THUMBNAIL_RUNNING_TIMEOUT = 600
+
+# Адаптивные варианты картинок постов (posts.image_variants) готовятся
+# вместе с превью. Форматы, которые не умеет сохранять Pillow, пропускаются.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+
+# Файлы загружаются потоком (posts.uploads) и принимаются, только если
+# по заголовку это картинка, какой бы тип ни объявил клиент. Файлы больше
+# POST_UPLOAD_MAX_BYTES или POST_UPLOAD_MAX_PIXELS отклоняются еще
+# при чтении запроса, EXIF удаляется, а стороны больше
+# POST_UPLOAD_MAX_SIDE уменьшаются.
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.BoundedImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+POST_UPLOAD_MAX_PIXELS = 40 * 10 ** 6
+POST_UPLOAD_MAX_SIDE = 2560
+POST_UPLOAD_HEADER_BYTES = 256 * 1024
+POST_UPLOAD_QUALITY = 90
+
+# Полнотекстовый поиск (search.engines). Совпадение в тексте поста
+# весит больше, чем совпадение в комментарии к нему.
+SEARCH_ENGINE = 'search.engines.Fts5Engine'
+SEARCH_POST_WEIGHT = 2
+
+# Число потоков, в которых ASGI-приложение (yatube.asgi) выполняет
+# view. Медленные клиенты их не занимают.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Размер страницы JSON API (api.views) по умолчанию и наибольший,
+# который можно запросить параметром ?limit=.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# Замеры запросов (core.metrics): заголовок Server-Timing, строка JSON
+# в логе core.metrics (видна при METRICS_LOG_LEVEL=INFO) и гистограммы
+# по именам адресов для команды show_metrics. Границы корзин — в мс.
+METRICS_ENABLED = True
+METRICS_CACHE = 'default'
+METRICS_FLUSH_INTERVAL = 10
+# Сколько воркеров может выгружать счетчики соединений одновременно.
+METRICS_WORKER_SLOTS = 64
+METRICS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Server-Timing раскрывает устройство сайта, поэтому без DEBUG заголовок
+# получает только персонал.
+METRICS_SERVER_TIMING = DEBUG
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
 }